@@ -5,8 +5,27 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, date
 import random
+import html
+
+from dataset_cache import DatasetCache, hash_file
+from snapshot_store import SnapshotStore, SnapshotExistsError
+from image_cache import ImageCache, ImagePrefetcher, pooled_session
+from core import (
+    MissingColumnsError, open_source, parse_source, compact_schema, memory_report,
+    MIXED_SORT_OPTIONS, SORT_KEYS, calculate_metrics, summarize, BADGES, compute_badges,
+    shuffle_mixed_brands, SortIndex, TOPK_SORTS, TopKOrder, split_by_brand, FilterEngine
+)
+from arrow_backend import ArrowCatalog, ArrowFilterEngine, CATALOG_PATH, catalog_fingerprint, filter_expression
+from profiling import StageProfiler, PROFILE_ENABLED, stage_percentiles
+from result_cache import ResultCache, filter_state_key
+from search_index import SearchIndex, tokenize
+from metrics_cube import MetricsCube
+from matching import ComparableMatcher, head_to_head
+from infinite_gallery import infinite_gallery, requested_slice
+from gallery_html import get_rating_stars, is_image_url, page_image_urls, product_cards_html, gallery_rows
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # ========== PAGE CONFIGURATION ==========
 st.set_page_config(
@@ -267,6 +286,13 @@ st.markdown("""
         background: linear-gradient(135deg, #C4142C 0%, #A31024 100%);
     }
     
+    /* Grid view layout */
+    .product-grid {
+        display: grid;
+        grid-template-columns: repeat(4, minmax(0, 1fr));
+        gap: 16px;
+    }
+    
     /* Brand column header */
     .brand-column-header {
         background: linear-gradient(135deg, #E31837 0%, #0046BE 100%);
@@ -336,92 +362,52 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ========== DATA LOADING FUNCTION ==========
+dataset_cache = DatasetCache()
+snapshot_store = SnapshotStore()
+
 @st.cache_data
+def get_memory_report(dataset_hash, _df):
+    """Memory report of a loaded dataset, computed once per dataset hash"""
+    return memory_report(_df)
+
+# A resource, not cache_data: every session and rerun gets the same frame instead of a copy,
+# and the engine, cube and indexes built from it all reference that one frame
+@st.cache_resource(max_entries=4)
 def load_data(file_path=None):
-    """Load and preprocess the Excel data for Macy's"""
+    """Load and preprocess the Excel or CSV data for Macy's, shared read-only by every session"""
     try:
         if file_path is None:
             default_path = Path("macys_data.xlsx")
             if default_path.exists():
-                df = pd.read_excel(default_path)
+                file_path = default_path
             else:
                 return create_dummy_data()
-        else:
-            df = pd.read_excel(file_path)
-        
-        # Clean column names
-        df.columns = df.columns.str.strip()
-        
-        # Standardize column names
-        column_mapping = {}
-        for col in df.columns:
-            col_lower = col.lower()
-            if 'image' in col_lower or 'img' in col_lower:
-                column_mapping[col] = 'Image_URL'
-            elif 'link' in col_lower or 'url' in col_lower:
-                column_mapping[col] = 'Product_Link'
-            elif 'qty' in col_lower or 'quantity' in col_lower or 'sold' in col_lower:
-                column_mapping[col] = 'Qty'
-            elif 'title' in col_lower or 'name' in col_lower or 'product' in col_lower:
-                column_mapping[col] = 'Title'
-            elif 'brand' in col_lower:
-                column_mapping[col] = 'Brand'
-            elif 'current' in col_lower or 'price' in col_lower:
-                column_mapping[col] = 'Current'
-            elif 'rating' in col_lower or 'avg rating' in col_lower:
-                column_mapping[col] = 'Avg Rating'
-            elif 'category' in col_lower:
-                column_mapping[col] = 'Category'
-        
-        df = df.rename(columns=column_mapping)
-        
-        # Check required columns
-        required_columns = ['Product_Link', 'Image_URL', 'Qty', 'Title', 'Brand', 'Current', 'Avg Rating']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            st.error(f"❌ Missing required columns: {', '.join(missing_columns)}")
-            st.info("Required columns: Product_Link, Image_URL, Qty, Title, Brand, Current, Avg Rating")
-            return create_dummy_data()
         
-        # Clean data
-        df['Brand'] = df['Brand'].astype(str).str.strip()
-        df['Title'] = df['Title'].astype(str).str.strip()
-        
-        # Handle Category column (optional)
-        if 'Category' in df.columns:
-            df['Category'] = df['Category'].astype(str).str.strip()
-            df['Category'] = df['Category'].fillna('Uncategorized')
-        else:
-            df['Category'] = 'Uncategorized'
-        
-        # Convert price to numeric (USD)
-        df['Current'] = pd.to_numeric(
-            df['Current'].astype(str)
-            .str.replace('$', '', regex=False)
-            .str.replace(',', '', regex=False)
-            .str.replace('USD', '', regex=False)
-            .str.strip(), 
-            errors='coerce'
-        ).fillna(0)
-        
-        # Convert Qty to numeric - fix for sorting
-        df['Qty'] = pd.to_numeric(df['Qty'], errors='coerce')
-        # Fill NaN values with 0 and convert to int
-        df['Qty'] = df['Qty'].fillna(0).astype(int)
-        
-        # Convert Avg Rating to numeric
-        df['Avg Rating'] = pd.to_numeric(df['Avg Rating'], errors='coerce').fillna(0)
+        with open_source(file_path) as source:
+            # Serve files we have already normalized straight from the Parquet cache
+            digest = hash_file(source)
+            df = dataset_cache.get(digest)
+            if df is not None:
+                df.attrs['dataset_hash'] = digest
+                return df
+            
+            df = parse_source(source, file_path)
         
-        # Clean URLs
-        df['Product_Link'] = df['Product_Link'].astype(str).str.strip()
-        df['Image_URL'] = df['Image_URL'].astype(str).str.strip()
+        df.attrs['dataset_hash'] = digest
         
-        # Remove rows with missing essential data
-        df = df.dropna(subset=['Brand', 'Title', 'Current'])
+        try:
+            dataset_cache.put(digest, df)
+        except Exception as e:
+            # A failed cache write must never block the dashboard from loading
+            st.warning(f"⚠️ Could not cache dataset: {str(e)}")
         
         return df
     
+    except MissingColumnsError as e:
+        st.error(f"❌ Missing required columns: {', '.join(e.missing_columns)}")
+        st.info("Required columns: Product_Link, Image_URL, Qty, Title, Brand, Current, Avg Rating")
+        return create_dummy_data()
+    
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
         return create_dummy_data()
@@ -454,105 +440,427 @@ def create_dummy_data():
         'Category': np.random.choice(categories, 100)
     }
     
-    return pd.DataFrame(data)
+    df = compact_schema(pd.DataFrame(data))
+    df.attrs['dataset_hash'] = 'dummy'
+    
+    return df
 
 # ========== ANALYSIS FUNCTIONS ==========
-def calculate_metrics(df, brands):
-    """Calculate key metrics for selected brands"""
-    metrics = {}
-    
-    for brand in brands:
-        brand_data = df[df['Brand'] == brand]
-        if len(brand_data) > 0:
-            avg_price = brand_data['Current'].mean()
-            total_qty = brand_data['Qty'].sum()
-            avg_rating = brand_data['Avg Rating'].mean()
-            
-            metrics[brand] = {
-                'avg_price': round(avg_price, 2),
-                'min_price': brand_data['Current'].min(),
-                'max_price': brand_data['Current'].max(),
-                'total_products': len(brand_data),
-                'total_qty': total_qty,
-                'avg_qty_per_product': round(total_qty / len(brand_data), 1) if len(brand_data) > 0 else 0,
-                'avg_rating': round(avg_rating, 1),
-                'rating_count': len(brand_data[brand_data['Avg Rating'] > 0])
-            }
-        else:
-            metrics[brand] = {
-                'avg_price': 0,
-                'min_price': 0,
-                'max_price': 0,
-                'total_products': 0,
-                'total_qty': 0,
-                'avg_qty_per_product': 0,
-                'avg_rating': 0,
-                'rating_count': 0
+@st.cache_data
+def get_brand_trends(snapshot_digests, brands, categories):
+    """Brand trends across stored snapshots, recomputed only when a snapshot is added"""
+    return snapshot_store.brand_trends(brands=brands, categories=categories)
+
+@st.cache_resource(max_entries=8)
+def get_sort_index(dataset_hash, _df):
+    """Shared SortIndex for a dataset, keyed by its content hash"""
+    # Top-k sorts never need a full permutation
+    return SortIndex(_df, [sort_by for sort_by in SORT_KEYS if sort_by not in TOPK_SORTS])
+
+# ========== FILTER ENGINE ==========
+@st.cache_resource(max_entries=4)
+def get_metrics_cube(dataset_hash, _df):
+    """Shared aggregate cube of a dataset, built once when it loads"""
+    return MetricsCube(_df)
+
+def get_filter_engine(df):
+    """This session's FilterEngine, rebuilt whenever a different dataset loads"""
+    engine = st.session_state.get('filter_engine')
+    if engine is None or engine.dataset_hash != df.attrs['dataset_hash']:
+        engine = FilterEngine(df, cube=get_metrics_cube(df.attrs['dataset_hash'], df))
+        st.session_state['filter_engine'] = engine
+    return engine
+
+@st.cache_resource
+def get_result_cache():
+    """Filter results shared by every session of this server process"""
+    return ResultCache()
+
+@st.cache_resource(max_entries=4)
+def get_search_index(dataset_hash, _df):
+    """Shared product search index for a dataset, built on its first search"""
+    return SearchIndex(_df)
+
+def filtered_positions(engine, filter_key, search_query, brands, price_range, min_rating, min_qty):
+    """Row positions passing every sidebar filter, cached per dataset and filter state"""
+    def compute():
+        engine.filter_search(search_query, lambda: get_search_index(engine.dataset_hash, engine.df))
+        engine.filter_brands(brands)
+        engine.filter_price(price_range)
+        engine.filter_min_rating(min_rating)
+        engine.filter_min_qty(min_qty)
+        return np.flatnonzero(engine.mask())
+    
+    return get_result_cache().get_or_compute(('rows', engine.dataset_hash, filter_key), compute)
+
+def filter_results(df, filter_key, positions, search_query, categories, brands, price_range, min_rating, min_qty):
+    """Brand metrics and filter summary for one filter state, rolled up from the metrics cube"""
+    def compute():
+        if tokenize(search_query):
+            # Search terms are not a cube dimension - aggregate the matching rows
+            filtered_df = df.iloc[positions]
+            return calculate_metrics(filtered_df, brands), summarize(filtered_df)
+        cube = get_metrics_cube(df.attrs['dataset_hash'], df)
+        return cube.rollup(categories, brands, price_range, min_rating, min_qty)
+    
+    return get_result_cache().get_or_compute(('metrics', df.attrs['dataset_hash'], filter_key), compute)
+
+def badge_summary(df, filter_key, positions, summary):
+    """The filter summary plus the Qty median that badges compare against, from the filtered rows"""
+    def compute():
+        qty = df['Qty'].to_numpy()[positions]
+        return {**summary, 'median_qty': float(np.median(qty)) if len(qty) else np.nan}
+    
+    return get_result_cache().get_or_compute(('badge_summary', df.attrs['dataset_hash'], filter_key), compute)
+
+def gallery_order(df, filter_key, positions, sort_by, brands):
+    """Positions of the filtered rows in gallery order for one sort option"""
+    def compute():
+        if sort_by in MIXED_SORT_OPTIONS:
+            mixed_df = shuffle_mixed_brands(
+                df.iloc[positions], brands, weighted=(sort_by == 'Mixed Brands (Weighted)')
+            )
+            return df.index.get_indexer(mixed_df.index)
+        if sort_by in TOPK_SORTS:
+            # Ordered lazily: only as many rows as the pages viewed so far
+            return TopKOrder.for_sort(df, positions, sort_by)
+        mask = np.zeros(len(df), dtype=bool)
+        mask[positions] = True
+        return get_sort_index(df.attrs['dataset_hash'], df).positions(sort_by, mask)
+    
+    # Mixed orders interleave brands in selection order, so that order is part of the key
+    key = ('order', df.attrs['dataset_hash'], filter_key, sort_by)
+    if sort_by in MIXED_SORT_OPTIONS:
+        key += (tuple(brands),)
+    return get_result_cache().get_or_compute(key, compute)
+
+def brand_gallery_orders(df, filter_key, positions, sort_by, brands):
+    """Each brand's filtered positions in gallery order, so Brand Columns page independently"""
+    def compute():
+        if sort_by in TOPK_SORTS:
+            return {
+                brand: TopKOrder.for_sort(df, brand_positions, sort_by)
+                for brand, brand_positions in split_by_brand(df, positions, brands).items()
             }
+        if sort_by in MIXED_SORT_OPTIONS:
+            # Interleaving never reorders a brand's own rows
+            return split_by_brand(df, positions, brands)
+        mask = np.zeros(len(df), dtype=bool)
+        mask[positions] = True
+        return split_by_brand(df, get_sort_index(df.attrs['dataset_hash'], df).positions(sort_by, mask), brands)
     
-    return metrics
+    return get_result_cache().get_or_compute(('brand_order', df.attrs['dataset_hash'], filter_key, sort_by), compute)
+
+@st.cache_resource(max_entries=2)
+def get_matcher(dataset_hash, _df):
+    """Title vectors and price blocks of a dataset, for comparable-product matching"""
+    return ComparableMatcher(_df)
+
+def comparable_matches(df, brands):
+    """Cross-brand matches among the selected brands, shared by all sessions"""
+    key = ('matches', df.attrs['dataset_hash'], tuple(sorted(brands)))
+    return get_result_cache().get_or_compute(key, lambda: get_matcher(df.attrs['dataset_hash'], df).match(brands))
+
+# ========== OUT-OF-CORE BACKEND ==========
+@st.cache_resource(max_entries=1)
+def get_arrow_catalog(catalog_path, fingerprint):
+    """Shared ArrowCatalog over the Parquet catalog at CATALOG_PATH, reopened when its files change"""
+    return ArrowCatalog(catalog_path)
+
+def get_arrow_filter_engine(catalog):
+    """This session's ArrowFilterEngine, rebuilt whenever the catalog files change"""
+    engine = st.session_state.get('filter_engine')
+    if not isinstance(engine, ArrowFilterEngine) or engine.dataset_hash != catalog.dataset_hash:
+        engine = ArrowFilterEngine(catalog)
+        st.session_state['filter_engine'] = engine
+    return engine
+
+@st.cache_data(max_entries=64)
+def get_arrow_metrics(dataset_hash, filter_state, brands, _catalog):
+    """Brand metrics and filter summary for one filter state, from two scans"""
+    expression = filter_expression(**dict(filter_state))
+    return _catalog.brand_metrics(expression, list(brands)), _catalog.summary(expression)
+
+@st.cache_data(max_entries=64)
+def get_arrow_page(dataset_hash, filter_state, sort_by, brand_counts, start, stop, _catalog):
+    """One gallery page for a filter state and sort option, scanned without loading the catalog"""
+    expression = filter_expression(**dict(filter_state))
+    if sort_by in SORT_KEYS:
+        return _catalog.page(expression, start, stop, sort_keys=SORT_KEYS[sort_by])
+    return _catalog.page(expression, start, stop, brand_counts=dict(brand_counts),
+                         weighted=(sort_by == 'Mixed Brands (Weighted)'))
+
+# ========== GALLERY RENDERING ==========
+PREFETCH_PREVIOUS_PAGE = True
+
+@st.cache_resource
+def get_image_cache():
+    """Thumbnail cache shared by every session"""
+    return ImageCache(session=pooled_session())
 
-def get_rating_stars(rating):
-    """Generate star rating HTML"""
-    full_stars = int(rating)
-    half_star = 1 if rating - full_stars >= 0.5 else 0
-    empty_stars = 5 - full_stars - half_star
-    
-    stars_html = '★' * full_stars
-    if half_star:
-        stars_html += '½'
-    stars_html += '☆' * empty_stars
-    
-    return stars_html
+@st.cache_resource
+def get_image_prefetcher():
+    """Background image fetcher shared by every session"""
+    return ImagePrefetcher(get_image_cache())
 
-def shuffle_mixed_brands(df, brands):
-    """Shuffle products but maintain brand mixing - ONLY for Mixed Brands sort option"""
-    mixed_df = df.copy()
-    
-    # Group by brand first
-    brand_groups = {}
-    for brand in brands:
-        brand_data = mixed_df[mixed_df['Brand'] == brand]
-        if len(brand_data) > 0:
-            brand_groups[brand] = brand_data
-    
-    # Create a mixed list of products
-    mixed_products = []
-    max_len = max(len(group) for group in brand_groups.values()) if brand_groups else 0
-    
-    for i in range(max_len):
-        for brand, group in brand_groups.items():
-            if i < len(group):
-                mixed_products.append(group.iloc[i])
-    
-    # Convert back to DataFrame
-    if mixed_products:
-        mixed_df = pd.DataFrame(mixed_products)
-    
-    return mixed_df
+def render_product_cards(page_df, badges, currency, show_brand=True, grid=False):
+    """Emit a whole block of product cards as a single markdown element"""
+    cards_html = product_cards_html(page_df, badges, currency, show_brand=show_brand,
+                                    image_cache=get_image_cache())
+    if grid:
+        cards_html = f'<div class="product-grid">{cards_html}</div>'
+    st.markdown(cards_html, unsafe_allow_html=True)
 
-def apply_sorting(df, sort_by):
-    """Apply sorting based on the selected sort option"""
-    sorted_df = df.copy()
-    
-    if sort_by == 'Price (High to Low)':
-        sorted_df = sorted_df.sort_values('Current', ascending=False)
-    elif sort_by == 'Price (Low to High)':
-        sorted_df = sorted_df.sort_values('Current', ascending=True)
-    elif sort_by == 'Rating (High to Low)':
-        sorted_df = sorted_df.sort_values('Avg Rating', ascending=False)
-    elif sort_by == 'Quantity Sold (High to Low)':
-        sorted_df = sorted_df.sort_values('Qty', ascending=False)
-    elif sort_by == 'Brand A-Z':
-        sorted_df = sorted_df.sort_values('Brand', ascending=True)
-    elif sort_by == 'Brand Z-A':
-        sorted_df = sorted_df.sort_values('Brand', ascending=False)
-    # Mixed Brands will be handled separately
-    
-    return sorted_df.reset_index(drop=True)
+def turn_gallery_page(step):
+    """Prev/Next callback: moves the gallery page before the fragment reruns"""
+    st.session_state['gallery_page'] = st.session_state.get('gallery_page', 1) + step
+
+@st.fragment
+def gallery_fragment(profiler, *args):
+    """Product Gallery tab; its controls and paging rerun only this fragment, not the whole script"""
+    ctx = get_script_run_ctx()
+    gallery_only = ctx is not None and bool(ctx.fragment_ids_this_run)
+    if gallery_only:
+        # The full run's record is already written - profile this rerun as a record of its own
+        profiler = StageProfiler(enabled=profiler.enabled, trace_memory=profiler.trace_memory)
+        profiler.annotate(fragment='gallery')
+    try:
+        render_gallery(profiler, *args)
+    finally:
+        if gallery_only and profiler.enabled:
+            profiler.write(session_id=ctx.session_id)
+
+def render_gallery(profiler, df, catalog, engine, filter_key, positions, filtered_count, selected_brands,
+                   metrics, summary, currency):
+    """Gallery controls, the current page of product cards and the pager"""
+    st.markdown("### 🖼️ Product Gallery")
+    
+    # Gallery controls
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        sort_by = st.selectbox(
+            "Sort products by",
+            ['Price (High to Low)', 'Price (Low to High)', 'Rating (High to Low)', 
+             'Quantity Sold (High to Low)', 'Brand A-Z', 'Brand Z-A', 'Mixed Brands',
+             'Mixed Brands (Weighted)'],
+            index=6,  # Default to Mixed Brands
+            help="Weighted mixing spreads each brand in proportion to its share of products"
+        )
+    
+    with col2:
+        products_per_page = st.selectbox(
+            "Products per page",
+            [24, 36, 48, 60, 72],
+            index=3  # Default to 60
+        )
+    
+    with col3:
+        view_mode = st.selectbox(
+            "View mode",
+            ['Brand Columns', 'Grid View', 'List View', 'Infinite Scroll'],
+            index=0,  # Default to Brand Columns
+            help="Infinite Scroll loads products as you scroll instead of paging"
+        )
+    
+    profiler.begin('sorting')
+    profiler.annotate(sort_by=sort_by, products_per_page=products_per_page, view_mode=view_mode)
+    
+    # Order the filtered rows as positions into df, so only the page is gathered;
+    # the out-of-core backend orders rows inside its page scan instead
+    per_brand = catalog is None and view_mode == 'Brand Columns'
+    infinite = view_mode == 'Infinite Scroll'
+    if catalog is not None:
+        gallery_positions = None
+    elif per_brand:
+        # Every brand column pages through its own products
+        brand_positions = brand_gallery_orders(df, filter_key, positions, sort_by, selected_brands)
+    else:
+        gallery_positions = gallery_order(df, filter_key, positions, sort_by, selected_brands)
+    
+    # Pagination - in Brand Columns each brand gets an even share of the page
+    if per_brand:
+        page_size = -(-products_per_page // len(selected_brands))
+        total_products = max(len(order) for order in brand_positions.values())
+    else:
+        page_size = products_per_page
+        total_products = filtered_count
+    total_pages = max(1, (total_products + page_size - 1) // page_size)
+    
+    # The page lives in session_state so gallery-only reruns keep it; a different
+    # result set (filters, sort, page size or view) starts again from page 1
+    result_state = (filter_key if catalog is None else engine.filter_state(), sort_by, products_per_page, view_mode)
+    if st.session_state.get('gallery_result') != result_state:
+        st.session_state['gallery_result'] = result_state
+        st.session_state['gallery_page'] = 1
+    st.session_state['gallery_page'] = min(max(1, st.session_state.get('gallery_page', 1)), total_pages)
+    
+    if infinite:
+        # The browser asks for the slice near its viewport; only that slice is serialized
+        result_id = f"{hash(result_state[:2]) & 0xffffffffffff:x}"
+        start_idx, end_idx = requested_slice(st.session_state.get('infinite_gallery'), result_id, total_products)
+        page = None
+    else:
+        if total_pages > 1:
+            page = st.number_input(
+                f"Page (1-{total_pages})",
+                min_value=1,
+                max_value=total_pages,
+                step=1,
+                key='gallery_page'
+            )
+        else:
+            page = 1
+        
+        start_idx = (page - 1) * page_size
+        end_idx = min(start_idx + page_size, total_products)
+    
+    profiler.begin('page')
+    profiler.annotate(page=page, slice=(start_idx, end_idx))
+    
+    prefetcher = get_image_prefetcher()
+    if catalog is not None:
+        # Only this page is materialized; badges only need the filter summary
+        brand_counts = tuple((brand, metrics[brand]['total_products']) for brand in selected_brands)
+        page_df = get_arrow_page(
+            catalog.dataset_hash, engine.filter_state(), sort_by, brand_counts, start_idx, end_idx, catalog
+        )
+        badges = compute_badges(page_df, summary)
+        prefetcher.prefetch(page_image_urls(page_df, np.arange(len(page_df))))
+    elif per_brand:
+        def brand_page_urls(start, stop):
+            return [url for order in brand_positions.values() for url in page_image_urls(df, order[start:stop])]
+        
+        brand_pages = {brand: df.iloc[order[start_idx:end_idx]] for brand, order in brand_positions.items()}
+        badges = compute_badges(pd.concat(brand_pages.values()),
+                                badge_summary(df, filter_key, positions, summary))
+        prefetcher.prefetch(brand_page_urls(start_idx, end_idx))
+        prefetcher.prefetch(brand_page_urls(end_idx, end_idx + page_size))
+        if PREFETCH_PREVIOUS_PAGE and start_idx > 0:
+            prefetcher.prefetch(brand_page_urls(max(0, start_idx - page_size), start_idx))
+    else:
+        page_df = df.iloc[gallery_positions[start_idx:end_idx]]
+        badges = compute_badges(page_df, badge_summary(df, filter_key, positions, summary))
+        
+        # Never wait on downloads: cards not cached yet load from their source URL, and this
+        # page's thumbnails are cached in the background for the next render
+        prefetcher.prefetch(page_image_urls(df, gallery_positions[start_idx:end_idx]))
+        if not infinite:
+            # Warm the neighbouring pages too, so paging lands on cached thumbnails
+            prefetcher.prefetch(page_image_urls(df, gallery_positions[end_idx:end_idx + products_per_page]))
+            if PREFETCH_PREVIOUS_PAGE and start_idx > 0:
+                prefetcher.prefetch(
+                    page_image_urls(df, gallery_positions[max(0, start_idx - products_per_page):start_idx])
+                )
+    
+    profiler.begin('gallery')
+    
+    if per_brand:
+        st.markdown(f"**Showing {start_idx + 1}-{end_idx} of each brand's products ({filtered_count} in total)**")
+    elif infinite:
+        st.markdown(f"**Scrolling through {total_products} products**")
+    else:
+        st.markdown(f"**Showing {start_idx + 1}-{end_idx} of {total_products} products**")
+    
+    if total_products == 0:
+        st.info("No products found with current filters.")
+    elif infinite:
+        infinite_gallery(result_id, total_products, start_idx, gallery_rows(page_df, badges, get_image_cache()),
+                         currency, BADGES, key='infinite_gallery')
+    elif view_mode == 'Brand Columns':
+        # Create one column for each selected brand
+        brand_cols = st.columns(len(selected_brands))
+        
+        for idx, brand in enumerate(selected_brands):
+            with brand_cols[idx]:
+                # Brand header
+                st.markdown(f"""
+                <div class="brand-column-header">
+                    {brand}
+                </div>
+                """, unsafe_allow_html=True)
+                
+                # Get products for this brand from current page
+                if per_brand:
+                    brand_products = brand_pages[brand]
+                else:
+                    brand_products = page_df[page_df['Brand'] == brand]
+                
+                if len(brand_products) > 0:
+                    # Already in sort order (Title within brand for the Brand sorts),
+                    # so render this brand's cards as one block
+                    render_product_cards(brand_products, badges, currency, show_brand=False)
+                else:
+                    st.info(f"No more products for {brand}" if per_brand else f"No products for {brand} on this page")
+    
+    elif view_mode == 'Grid View':
+        # Grid layout with 4 columns, rendered as one block
+        render_product_cards(page_df, badges, currency, grid=True)
+    
+    else:  # List View
+        # DO NOT shuffle for List View unless Mixed Brands is selected
+        # The sorting is already applied to page_df
+        list_df = page_df.copy()  # Use the already sorted page_df
+        
+        for _, product in list_df.iterrows():
+            cols = st.columns([1, 3, 1, 1, 1, 1])
+            
+            with cols[0]:
+                image_url = str(product.get('Image_URL', '')).strip()
+                if is_image_url(image_url):
+                    try:
+                        thumbnail = get_image_cache().get(image_url, 'list', fetch=False)
+                        st.image(thumbnail if thumbnail is not None else image_url, width=80)
+                    except:
+                        st.image("https://via.placeholder.com/80x80.png?text=IMG", width=80)
+                else:
+                    st.image("https://via.placeholder.com/80x80.png?text=N/A", width=80)
+            
+            with cols[1]:
+                st.markdown(f"**{product['Brand']}**")
+                st.markdown(f"{product['Title'][:70]}{'...' if len(product['Title']) > 70 else ''}")
+                st.markdown(f"<small style='color: #666;'>{product['Category']}</small>", unsafe_allow_html=True)
+                if product['Avg Rating'] > 0:
+                    stars = get_rating_stars(product['Avg Rating'])
+                    st.markdown(f"<small>{stars} {product['Avg Rating']:.1f}</small>", unsafe_allow_html=True)
+            
+            with cols[2]:
+                st.markdown(f"**{currency}{product['Current']:.2f}**")
+            
+            with cols[3]:
+                # Show quantity sold
+                qty_text = f"{product['Qty']:,} sold"
+                if product['Qty'] == 0:
+                    qty_text = "New"
+                st.markdown(qty_text)
+            
+            with cols[4]:
+                st.markdown(f"⭐ {product['Avg Rating']:.1f}")
+            
+            with cols[5]:
+                product_link = str(product.get('Product_Link', '')).strip()
+                if product_link and product_link != 'nan' and product_link.startswith('http'):
+                    st.markdown(f'<a href="{product_link}" target="_blank" class="product-link" style="padding: 5px 10px; font-size: 12px;">View</a>', 
+                              unsafe_allow_html=True)
+                else:
+                    st.markdown(f'<button class="product-link" disabled style="padding: 5px 10px; font-size: 12px;">No Link</button>', 
+                              unsafe_allow_html=True)
+            
+            st.markdown("---")
+    
+    # Pagination controls at bottom
+    if total_pages > 1 and not infinite:
+        st.markdown(f"**Page {page} of {total_pages}**")
+        cols = st.columns(5)
+        with cols[2]:
+            if page > 1:
+                st.button("◀ Previous", on_click=turn_gallery_page, args=(-1,))
+        with cols[3]:
+            if page < total_pages:
+                st.button("Next ▶", on_click=turn_gallery_page, args=(1,))
 
 # ========== MAIN APP ==========
-def main():
+def render_dashboard(profiler):
     # Set currency for Macy's USA
     currency = "$"
     
@@ -569,30 +877,82 @@ def main():
         st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/4/4a/Macy%27s_Logo.svg/2560px-Macy%27s_Logo.svg.png", width='stretch')
         st.markdown("### 📊 Dashboard Controls")
         
-        # File uploader
-        uploaded_file = st.file_uploader(
-            "Upload Macy's Excel File", 
-            type=['xlsx', 'xls', 'csv'], 
-            help="Upload your Macy's competitive data file"
-        )
+        profiler.begin('load')
         
-        st.markdown("---")
+        # A configured Parquet catalog is queried in place instead of loaded into memory
+        catalog = get_arrow_catalog(CATALOG_PATH, catalog_fingerprint(CATALOG_PATH)) if CATALOG_PATH else None
         
-        # Load data
-        if uploaded_file is not None:
-            df = load_data(uploaded_file)
+        if catalog is not None:
+            st.success(f"✅ Querying {catalog.count():,} products out-of-core from {catalog.source.name}")
+            df = None
+            engine = get_arrow_filter_engine(catalog)
         else:
-            df = load_data()
+            # File uploader
+            uploaded_file = st.file_uploader(
+                "Upload Macy's Excel File", 
+                type=['xlsx', 'xls', 'csv'], 
+                help="Upload your Macy's competitive data file"
+            )
         
-        if len(df) == 0:
-            st.error("❌ No valid data loaded. Please check your Excel file format.")
-            st.stop()
+            st.markdown("---")
         
-        st.success(f"✅ Loaded {len(df)} products from Macy's")
+            # Load data
+            if uploaded_file is not None:
+                df = load_data(uploaded_file)
+            else:
+                df = load_data()
+        
+            if len(df) == 0:
+                st.error("❌ No valid data loaded. Please check your Excel file format.")
+                st.stop()
+        
+            st.success(f"✅ Loaded {len(df)} products from Macy's")
+        
+            with st.expander("🧮 Memory usage"):
+                report = get_memory_report(df.attrs['dataset_hash'], df)
+                total = report.iloc[-1]
+                st.caption(
+                    f"Compact layout: {total['Compact MB']:.1f} MB vs {total['Plain MB']:.1f} MB "
+                    f"with plain dtypes ({total['Saved %']:.0f}% saved)"
+                )
+                st.dataframe(report, hide_index=True, width='stretch')
+        
+            with st.expander("🗂️ Snapshot history"):
+                snapshot_dates = snapshot_store.snapshot_dates()
+                if snapshot_dates:
+                    st.caption(f"{len(snapshot_dates)} snapshots stored, latest {snapshot_dates[-1]:%Y-%m-%d}")
+                else:
+                    st.caption("No snapshots stored yet")
+            
+                dataset_hash = df.attrs['dataset_hash']
+                if dataset_hash == 'dummy':
+                    st.caption("Load a real data file to add it to the history")
+                elif snapshot_store.has(dataset_hash):
+                    st.caption("✅ This file is already in the history")
+                else:
+                    snapshot_date = st.date_input("Snapshot date", value=date.today())
+                    if st.button("Save snapshot"):
+                        try:
+                            snapshot_store.ingest(df, snapshot_date, dataset_hash)
+                            st.success(f"✅ Saved snapshot for {snapshot_date:%Y-%m-%d}")
+                        except SnapshotExistsError as e:
+                            st.error(f"❌ {str(e)}")
+        
+            engine = get_filter_engine(df)
+        
+        profiler.begin('filters')
+        
+        # Product search
+        st.markdown("### 🔎 Search Products")
+        search_query = st.text_input(
+            "Search titles",
+            placeholder="e.g. ankle boots",
+            help="Every word must appear in the title; words of 3+ letters also match inside longer words"
+        )
         
         # Category Filter
         st.markdown("### 📁 Category Filter")
-        all_categories = sorted(df['Category'].unique().tolist())
+        all_categories = engine.categories()
         
         selected_categories = st.multiselect(
             "Select Categories",
@@ -602,16 +962,15 @@ def main():
         )
         
         # Apply category filter
-        if selected_categories:
-            filtered_df = df[df['Category'].isin(selected_categories)]
-        else:
-            filtered_df = df.copy()
+        engine.filter_categories(selected_categories)
+        facets = engine.category_facets(selected_categories)
         
         st.markdown("---")
         
         # Brand Selection
         st.markdown("### 🏷️ Select Brands")
-        all_brands = sorted(filtered_df['Brand'].unique().tolist())
+        all_brands = facets['brands']
+        brand_facet_counts = facets['brand_counts']
         
         selected_brands = st.multiselect(
             "Choose brands to analyze",
@@ -624,12 +983,17 @@ def main():
             st.warning("⚠️ Please select at least one brand")
             return
         
+        # Counts stay out of the option labels: Streamlit keys the widget on its labels, so
+        # counts that change with the categories would reset the selection
+        st.caption(" · ".join(f"{brand}: {brand_facet_counts.get(brand, 0):,}" for brand in selected_brands)
+                   + " products in the selected categories")
+        
         st.markdown("---")
         
         # Price Range Filter
         st.markdown("### 💰 Price Range Filter")
-        min_price = float(filtered_df['Current'].min())
-        max_price = float(filtered_df['Current'].max())
+        min_price = facets['min_price']
+        max_price = facets['max_price']
         
         price_range = st.slider(
             "Select price range",
@@ -656,26 +1020,41 @@ def main():
         min_qty = st.number_input(
             "Minimum quantity sold",
             min_value=0,
-            max_value=int(filtered_df['Qty'].max()),
+            max_value=facets['max_qty'],
             value=0,
             step=10
         )
         
         st.markdown("---")
         
-        # Apply all filters
-        filtered_df = filtered_df[filtered_df['Brand'].isin(selected_brands)]
-        filtered_df = filtered_df[
-            (filtered_df['Current'] >= price_range[0]) & 
-            (filtered_df['Current'] <= price_range[1])
-        ]
-        filtered_df = filtered_df[filtered_df['Avg Rating'] >= min_rating]
-        filtered_df = filtered_df[filtered_df['Qty'] >= min_qty]
+        # Apply all filters - each predicate mask is reused until its control changes,
+        # and filter states any session has already seen are served from the result cache
+        if catalog is not None:
+            engine.filter_search(search_query)
+            engine.filter_brands(selected_brands)
+            engine.filter_price(price_range)
+            engine.filter_min_rating(min_rating)
+            engine.filter_min_qty(min_qty)
+            filtered_count = catalog.count(engine.mask())
+            filter_key = positions = None
+        else:
+            filter_key = filter_state_key(selected_categories, selected_brands, price_range, min_rating, min_qty,
+                                          search_query)
+            positions = filtered_positions(engine, filter_key, search_query, selected_brands, price_range,
+                                           min_rating, min_qty)
+            filtered_count = len(positions)
+        
+        st.markdown(f"**Filtered Results:** {filtered_count} products")
         
-        st.markdown(f"**Filtered Results:** {len(filtered_df)} products")
+        profiler.annotate(
+            dataset_hash=catalog.dataset_hash if catalog is not None else df.attrs['dataset_hash'],
+            filters={'search': search_query, 'categories': selected_categories, 'brands': selected_brands,
+                     'price_range': price_range, 'min_rating': min_rating, 'min_qty': min_qty},
+            filtered_count=filtered_count
+        )
 
     # ========== FILTER DISPLAY ==========
-    if len(filtered_df) == 0:
+    if filtered_count == 0:
         st.warning("⚠️ No data available for the selected filters. Please adjust your selection.")
         return
     
@@ -688,9 +1067,12 @@ def main():
     else:
         category_display = "All"
     
+    search_tag = f'<span class="filter-tag">🔎 Search: {html.escape(search_query)}</span>' if search_query.strip() else ''
+    
     filter_text = f"""
     <div class="filter-display">
         <h3>🔍 Active Filters</h3>
+        {search_tag}
         <span class="filter-tag">📁 Categories: {category_display}</span>
         <span class="filter-tag">🏷️ Brands: {len(selected_brands)} selected</span>
         <span class="filter-tag">💰 Price: ${price_range[0]:.2f} - ${price_range[1]:.2f}</span>
@@ -701,11 +1083,19 @@ def main():
     st.markdown(filter_text, unsafe_allow_html=True)
     
     # ========== MAIN CONTENT ==========
+    profiler.begin('metrics')
+    
     # Calculate metrics
-    metrics = calculate_metrics(filtered_df, selected_brands)
+    if catalog is not None:
+        metrics, summary = get_arrow_metrics(
+            catalog.dataset_hash, engine.filter_state(), tuple(selected_brands), catalog
+        )
+    else:
+        metrics, summary = filter_results(df, filter_key, positions, search_query, selected_categories,
+                                          selected_brands, price_range, min_rating, min_qty)
     
     # ========== TABS ==========
-    tab1, tab2 = st.tabs(["📊 Key Metrics", "🖼️ Product Gallery"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📊 Key Metrics", "🖼️ Product Gallery", "📈 Price Trends", "🤝 Head-to-Head"])
     
     # ========== TAB 1: KEY METRICS ==========
     with tab1:
@@ -724,7 +1114,7 @@ def main():
             if metrics[brand]['total_products'] > 0:
                 with cols[col_idx]:
                     # Brand header with color based on price positioning
-                    price_position = "🏆 Premium" if metrics[brand]['avg_price'] > filtered_df['Current'].mean() else "💎 Value"
+                    price_position = "🏆 Premium" if metrics[brand]['avg_price'] > summary['avg_price'] else "💎 Value"
                     
                     st.markdown(f"""
                     <div style="background: {'linear-gradient(135deg, #E31837, #C4142C)' if price_position == '🏆 Premium' else 'linear-gradient(135deg, #0046BE, #002D72)'}; 
@@ -738,8 +1128,8 @@ def main():
                     st.metric(
                         "Avg Price",
                         f"{currency}{metrics[brand]['avg_price']:.2f}",
-                        delta=f"{((metrics[brand]['avg_price'] - filtered_df['Current'].mean()) / filtered_df['Current'].mean() * 100):.1f}% vs avg" 
-                        if filtered_df['Current'].mean() > 0 else None
+                        delta=f"{((metrics[brand]['avg_price'] - summary['avg_price']) / summary['avg_price'] * 100):.1f}% vs avg" 
+                        if summary['avg_price'] > 0 else None
                     )
                     
                     col_a, col_b = st.columns(2)
@@ -763,331 +1153,113 @@ def main():
     
     # ========== TAB 2: PRODUCT GALLERY ==========
     with tab2:
-        st.markdown("### 🖼️ Product Gallery")
-        
-        # Gallery controls
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            sort_by = st.selectbox(
-                "Sort products by",
-                ['Price (High to Low)', 'Price (Low to High)', 'Rating (High to Low)', 
-                 'Quantity Sold (High to Low)', 'Brand A-Z', 'Brand Z-A', 'Mixed Brands'],
-                index=6  # Default to Mixed Brands
-            )
-        
-        with col2:
-            products_per_page = st.selectbox(
-                "Products per page",
-                [24, 36, 48, 60, 72],
-                index=3  # Default to 60
-            )
-        
-        with col3:
-            view_mode = st.selectbox(
-                "View mode",
-                ['Brand Columns', 'Grid View', 'List View'],
-                index=0  # Default to Brand Columns
-            )
-        
-        # Apply sorting to the entire dataframe FIRST
-        gallery_df = filtered_df.copy()
-        
-        # Handle Mixed Brands separately
-        if sort_by == 'Mixed Brands':
-            gallery_df = shuffle_mixed_brands(gallery_df, selected_brands)
-        else:
-            gallery_df = apply_sorting(gallery_df, sort_by)
-        
-        # Reset index after sorting
-        gallery_df = gallery_df.reset_index(drop=True)
-        
-        # Pagination
-        total_products = len(gallery_df)
-        total_pages = max(1, (total_products + products_per_page - 1) // products_per_page)
+        gallery_fragment(profiler, df, catalog, engine, filter_key, positions, filtered_count, selected_brands,
+                         metrics, summary, currency)
+    
+    # ========== TAB 3: PRICE TRENDS ==========
+    with tab3:
+        profiler.begin('trends')
         
-        if total_pages > 1:
-            page = st.number_input(
-                f"Page (1-{total_pages})",
-                min_value=1,
-                max_value=total_pages,
-                value=1,
-                step=1
-            )
-        else:
-            page = 1
+        st.markdown("### 📈 Brand Trends Over Time")
         
-        start_idx = (page - 1) * products_per_page
-        end_idx = min(start_idx + products_per_page, total_products)
+        # Push the category filter down only when it actually narrows the data
+        trend_categories = tuple(selected_categories) if len(selected_categories) < len(all_categories) else ()
+        trends = get_brand_trends(tuple(sorted(snapshot_store.manifest())), tuple(selected_brands), trend_categories)
         
-        if total_products > 0:
-            page_df = gallery_df.iloc[start_idx:end_idx]
+        if trends is None or len(trends) == 0:
+            st.info("No snapshots for the selected brands yet. Save the loaded file from 🗂️ Snapshot history in the sidebar.")
         else:
-            page_df = pd.DataFrame()
-        
-        st.markdown(f"**Showing {start_idx + 1}-{end_idx} of {total_products} products**")
-        
-        if total_products == 0:
-            st.info("No products found with current filters.")
-        elif view_mode == 'Brand Columns':
-            # Create one column for each selected brand
-            brand_cols = st.columns(len(selected_brands))
+            st.caption(f"{trends['Snapshot Date'].nunique()} snapshots, "
+                       f"{trends['Snapshot Date'].min():%Y-%m-%d} to {trends['Snapshot Date'].max():%Y-%m-%d}")
             
-            for idx, brand in enumerate(selected_brands):
-                with brand_cols[idx]:
-                    # Brand header
-                    st.markdown(f"""
-                    <div class="brand-column-header">
-                        {brand}
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Get products for this brand from current page
-                    brand_products = page_df[page_df['Brand'] == brand]
-                    
-                    if len(brand_products) > 0:
-                        # Apply the SAME sorting within brand column
-                        if sort_by == 'Mixed Brands':
-                            # Keep the mixed order as is
-                            pass
-                        elif sort_by == 'Price (High to Low)':
-                            brand_products = brand_products.sort_values('Current', ascending=False)
-                        elif sort_by == 'Price (Low to High)':
-                            brand_products = brand_products.sort_values('Current', ascending=True)
-                        elif sort_by == 'Rating (High to Low)':
-                            brand_products = brand_products.sort_values('Avg Rating', ascending=False)
-                        elif sort_by == 'Quantity Sold (High to Low)':
-                            brand_products = brand_products.sort_values('Qty', ascending=False)
-                        elif sort_by == 'Brand A-Z':
-                            brand_products = brand_products.sort_values('Title', ascending=True)
-                        elif sort_by == 'Brand Z-A':
-                            brand_products = brand_products.sort_values('Title', ascending=False)
-                        
-                        # Display all products for this brand in the column
-                        for _, product in brand_products.iterrows():
-                            # Determine badge based on criteria
-                            badges = []
-                            if product['Current'] > filtered_df['Current'].mean() * 1.2:
-                                badges.append(('badge-premium', 'PREMIUM'))
-                            elif product['Avg Rating'] >= 4.5:
-                                badges.append(('badge-best', 'TOP RATED'))
-                            elif product['Qty'] > filtered_df['Qty'].median() * 2:
-                                badges.append(('badge-value', 'BEST SELLER'))
-                            elif product['Qty'] == 0:
-                                badges.append(('badge-soldout', 'NEW'))
-                            
-                            # Product card
-                            st.markdown('<div class="product-card">', unsafe_allow_html=True)
-                            
-                            # Badges
-                            if badges:
-                                badge_html = '<div class="product-badges">'
-                                for badge_class, badge_text in badges:
-                                    badge_html += f'<div class="badge {badge_class}">{badge_text}</div>'
-                                badge_html += '</div>'
-                                st.markdown(badge_html, unsafe_allow_html=True)
-                            
-                            # Image
-                            image_url = str(product.get('Image_URL', '')).strip()
-                            if image_url and image_url != 'nan' and image_url.startswith(('http://', 'https://')):
-                                try:
-                                    st.image(image_url, use_container_width=True)
-                                except:
-                                    st.image("https://via.placeholder.com/300x400.png?text=Product+Image", 
-                                           use_container_width=True)
-                            else:
-                                st.image("https://via.placeholder.com/300x400.png?text=Macy%27s+Product", 
-                                       use_container_width=True)
-                            
-                            # Category
-                            st.markdown(f"<div class='product-category'>{product['Category']}</div>", unsafe_allow_html=True)
-                            
-                            # Title
-                            title = product['Title'][:60] + ('...' if len(product['Title']) > 60 else '')
-                            st.markdown(f"<div class='product-title'>{title}</div>", unsafe_allow_html=True)
-                            
-                            # Price
-                            st.markdown(f"<div class='product-price'>{currency}{product['Current']:.2f}</div>", unsafe_allow_html=True)
-                            
-                            # Quantity Sold - CHANGED LABEL
-                            qty_text = f"Qty Sold: {product['Qty']:,}"
-                            if product['Qty'] == 0:
-                                qty_text = "New Product"
-                            elif product['Qty'] < 10:
-                                qty_text += " 🔥"
-                            st.markdown(f"<div class='product-qty'>{qty_text}</div>", unsafe_allow_html=True)
-                            
-                            # Rating
-                            if product['Avg Rating'] > 0:
-                                stars = get_rating_stars(product['Avg Rating'])
-                                st.markdown(f"""
-                                <div class='product-rating'>
-                                    <span class='rating-stars'>{stars}</span>
-                                    <span class='rating-value'>{product['Avg Rating']:.1f}</span>
-                                </div>
-                                """, unsafe_allow_html=True)
-                            
-                            # Links
-                            st.markdown('<div class="product-links">', unsafe_allow_html=True)
-                            product_link = str(product.get('Product_Link', '')).strip()
-                            if product_link and product_link != 'nan' and product_link.startswith('http'):
-                                st.markdown(f'<a href="{product_link}" target="_blank" class="product-link">View Product</a>', 
-                                          unsafe_allow_html=True)
-                            else:
-                                st.markdown(f'<button class="product-link" disabled>No Link</button>', 
-                                          unsafe_allow_html=True)
-                            st.markdown('</div>', unsafe_allow_html=True)
-                            
-                            st.markdown('</div>', unsafe_allow_html=True)
-                    else:
-                        st.info(f"No products for {brand} on this page")
+            for metric, title in [('Avg Price', 'Average Price ($)'), ('Total Qty', 'Total Quantity Sold'),
+                                  ('Avg Rating', 'Average Rating')]:
+                fig = px.line(trends, x='Snapshot Date', y=metric, color='Brand', markers=True, title=title)
+                fig.update_layout(height=350, legend_title_text='')
+                st.plotly_chart(fig)
+    
+    # ========== TAB 4: HEAD-TO-HEAD ==========
+    with tab4:
+        profiler.begin('head_to_head')
         
-        elif view_mode == 'Grid View':
-            # Grid layout with 4 columns
-            cols = st.columns(4)
-            for idx, (_, product) in enumerate(page_df.iterrows()):
-                col_idx = idx % 4
-                with cols[col_idx]:
-                    # Determine badge based on criteria
-                    badges = []
-                    if product['Current'] > filtered_df['Current'].mean() * 1.2:
-                        badges.append(('badge-premium', 'PREMIUM'))
-                    elif product['Avg Rating'] >= 4.5:
-                        badges.append(('badge-best', 'TOP RATED'))
-                    elif product['Qty'] > filtered_df['Qty'].median() * 2:
-                        badges.append(('badge-value', 'BEST SELLER'))
-                    elif product['Qty'] == 0:
-                        badges.append(('badge-soldout', 'NEW'))
-                    
-                    # Product card
-                    st.markdown('<div class="product-card">', unsafe_allow_html=True)
-                    
-                    # Badges
-                    if badges:
-                        badge_html = '<div class="product-badges">'
-                        for badge_class, badge_text in badges:
-                            badge_html += f'<div class="badge {badge_class}">{badge_text}</div>'
-                        badge_html += '</div>'
-                        st.markdown(badge_html, unsafe_allow_html=True)
-                    
-                    # Image
-                    image_url = str(product.get('Image_URL', '')).strip()
-                    if image_url and image_url != 'nan' and image_url.startswith(('http://', 'https://')):
-                        try:
-                            st.image(image_url, use_container_width=True)
-                        except:
-                            st.image("https://via.placeholder.com/300x400.png?text=Product+Image", 
-                                   use_container_width=True)
-                    else:
-                        st.image("https://via.placeholder.com/300x400.png?text=Macy%27s+Product", 
-                               use_container_width=True)
-                    
-                    # Category
-                    st.markdown(f"<div class='product-category'>{product['Category']}</div>", unsafe_allow_html=True)
-                    
-                    # Brand
-                    st.markdown(f"<div class='product-brand'>{product['Brand']}</div>", unsafe_allow_html=True)
-                    
-                    # Title
-                    title = product['Title'][:60] + ('...' if len(product['Title']) > 60 else '')
-                    st.markdown(f"<div class='product-title'>{title}</div>", unsafe_allow_html=True)
-                    
-                    # Price
-                    st.markdown(f"<div class='product-price'>{currency}{product['Current']:.2f}</div>", unsafe_allow_html=True)
-                    
-                    # Quantity Sold - CHANGED LABEL
-                    qty_text = f"Qty Sold: {product['Qty']:,}"
-                    if product['Qty'] == 0:
-                        qty_text = "New Product"
-                    elif product['Qty'] < 10:
-                        qty_text += " 🔥"
-                    st.markdown(f"<div class='product-qty'>{qty_text}</div>", unsafe_allow_html=True)
-                    
-                    # Rating
-                    if product['Avg Rating'] > 0:
-                        stars = get_rating_stars(product['Avg Rating'])
-                        st.markdown(f"""
-                        <div class='product-rating'>
-                            <span class='rating-stars'>{stars}</span>
-                            <span class='rating-value'>{product['Avg Rating']:.1f}</span>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    # Links
-                    st.markdown('<div class="product-links">', unsafe_allow_html=True)
-                    product_link = str(product.get('Product_Link', '')).strip()
-                    if product_link and product_link != 'nan' and product_link.startswith('http'):
-                        st.markdown(f'<a href="{product_link}" target="_blank" class="product-link">View Product</a>', 
-                                  unsafe_allow_html=True)
-                    else:
-                        st.markdown(f'<button class="product-link" disabled>No Link</button>', 
-                                  unsafe_allow_html=True)
-                    st.markdown('</div>', unsafe_allow_html=True)
-                    
-                    st.markdown('</div>', unsafe_allow_html=True)
+        st.markdown("### 🤝 Comparable Products Across Brands")
         
-        else:  # List View
-            # DO NOT shuffle for List View unless Mixed Brands is selected
-            # The sorting is already applied to page_df
-            list_df = page_df.copy()  # Use the already sorted page_df
+        if catalog is not None:
+            st.info("Head-to-head matching needs the catalog in memory; unset CATALOG_PATH to use it.")
+        elif len(selected_brands) < 2:
+            st.info("Select at least two brands to compare products head-to-head.")
+        elif st.toggle("Match comparable products", value=len(df) <= 50_000,
+                       help="Each product is paired with the most similar title of every other selected brand, "
+                            "within the same category and price band"):
+            matches = comparable_matches(df, selected_brands)
             
-            for _, product in list_df.iterrows():
-                cols = st.columns([1, 3, 1, 1, 1, 1])
-                
-                with cols[0]:
-                    image_url = str(product.get('Image_URL', '')).strip()
-                    if image_url and image_url != 'nan' and image_url.startswith(('http://', 'https://')):
-                        try:
-                            st.image(image_url, width=80)
-                        except:
-                            st.image("https://via.placeholder.com/80x80.png?text=IMG", width=80)
-                    else:
-                        st.image("https://via.placeholder.com/80x80.png?text=N/A", width=80)
-                
-                with cols[1]:
-                    st.markdown(f"**{product['Brand']}**")
-                    st.markdown(f"{product['Title'][:70]}{'...' if len(product['Title']) > 70 else ''}")
-                    st.markdown(f"<small style='color: #666;'>{product['Category']}</small>", unsafe_allow_html=True)
-                    if product['Avg Rating'] > 0:
-                        stars = get_rating_stars(product['Avg Rating'])
-                        st.markdown(f"<small>{stars} {product['Avg Rating']:.1f}</small>", unsafe_allow_html=True)
-                
-                with cols[2]:
-                    st.markdown(f"**{currency}{product['Current']:.2f}**")
-                
-                with cols[3]:
-                    # Show quantity sold
-                    qty_text = f"{product['Qty']:,} sold"
-                    if product['Qty'] == 0:
-                        qty_text = "New"
-                    st.markdown(qty_text)
-                
-                with cols[4]:
-                    st.markdown(f"⭐ {product['Avg Rating']:.1f}")
-                
-                with cols[5]:
-                    product_link = str(product.get('Product_Link', '')).strip()
-                    if product_link and product_link != 'nan' and product_link.startswith('http'):
-                        st.markdown(f'<a href="{product_link}" target="_blank" class="product-link" style="padding: 5px 10px; font-size: 12px;">View</a>', 
-                                  unsafe_allow_html=True)
-                    else:
-                        st.markdown(f'<button class="product-link" disabled style="padding: 5px 10px; font-size: 12px;">No Link</button>', 
-                                  unsafe_allow_html=True)
+            # Only products that pass the current filters
+            in_filter = np.zeros(len(df), dtype=bool)
+            in_filter[positions] = True
+            matches = matches[in_filter[matches['position'].to_numpy()]]
+            
+            min_similarity = st.slider("Minimum title similarity", 0.3, 1.0, 0.5, 0.05)
+            pairs = head_to_head(df, matches[matches['similarity'] >= min_similarity])
+            
+            if len(pairs) == 0:
+                st.info("No comparable products at this similarity. Try lowering the threshold.")
+            else:
+                # Median price gap of the row brand against each rival, over its matched products
+                summary_table = (
+                    pairs.groupby(['Brand', 'Rival Brand'])
+                    .agg(Matched=('Gap', 'size'), **{'Median Gap %': ('Gap %', 'median'),
+                                                      'Cheaper %': ('Gap', lambda gap: (gap < 0).mean() * 100)})
+                    .round(1)
+                    .reset_index()
+                )
+                st.markdown("**Price gap vs. rival brands** (negative = cheaper than the comparable rival product)")
+                st.dataframe(summary_table, hide_index=True, width='stretch')
                 
-                st.markdown("---")
+                st.markdown(f"**Closest matches** ({len(pairs):,} pairs, most similar first)")
+                st.dataframe(
+                    pairs.sort_values('Similarity', ascending=False, kind='stable').head(500),
+                    hide_index=True, width='stretch',
+                    column_config={
+                        'Price': st.column_config.NumberColumn(format=f"{currency}%.2f"),
+                        'Rival Price': st.column_config.NumberColumn(format=f"{currency}%.2f"),
+                        'Gap': st.column_config.NumberColumn(format=f"{currency}%.2f")
+                    }
+                )
+    
+    if catalog is None:
+        with st.sidebar.expander("♻️ Result cache"):
+            stats = get_result_cache().stats()
+            st.caption(f"{stats.attrs['entries']} results, {stats.attrs['used_bytes'] / 1024 ** 2:.1f} of "
+                       f"{stats.attrs['max_bytes'] / 1024 ** 2:.0f} MB, shared by all sessions")
+            st.dataframe(stats, hide_index=True, width='stretch')
+
+def render_profile(profiler):
+    """Sidebar panel with this run's stage timings and the percentiles over the log"""
+    with st.sidebar.expander("⏱️ Stage timings"):
+        record = profiler.record()
+        st.caption(f"This run: {record['total_ms']:.0f} ms")
+        if record['stages']:
+            stages = pd.DataFrame(record['stages']).rename(columns={
+                'stage': 'Stage', 'ms': 'ms', 'peak_mb': 'Peak MB', 'retained_mb': 'Retained MB'
+            })
+            st.dataframe(stages.round(2), hide_index=True, width='stretch')
         
-        # Pagination controls at bottom
-        if total_pages > 1:
-            st.markdown(f"**Page {page} of {total_pages}**")
-            cols = st.columns(5)
-            with cols[2]:
-                if page > 1:
-                    if st.button("◀ Previous"):
-                        st.rerun()
-            with cols[3]:
-                if page < total_pages:
-                    if st.button("Next ▶"):
-                        st.rerun()
+        percentiles = stage_percentiles(profiler.log_path)
+        if percentiles is not None:
+            st.caption(f"Logged runs, {profiler.log_path}")
+            st.dataframe(percentiles, hide_index=True, width='stretch')
+
+def main():
+    # Profile with DASHBOARD_PROFILE=1, or per session with ?profile=1 in the URL;
+    # only the server-wide switch traces memory, which would slow every session
+    profiler = StageProfiler(enabled=PROFILE_ENABLED or st.query_params.get('profile') == '1')
+    try:
+        render_dashboard(profiler)
+    finally:
+        if profiler.enabled:
+            ctx = get_script_run_ctx()
+            profiler.write(session_id=ctx.session_id if ctx is not None else None)
+            render_profile(profiler)
 
 if __name__ == "__main__":
     main()
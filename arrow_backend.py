@@ -0,0 +1,351 @@
+"""Out-of-core catalog queries pushed down to pyarrow dataset scans over Parquet"""
+import hashlib
+import os
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from search_index import NGRAM, tokenize
+
+# ========== CONFIGURATION ==========
+# Normalized Parquet file or directory to query out-of-core; unset keeps the in-memory backend
+CATALOG_PATH = os.environ.get("CATALOG_PATH")
+SCAN_BATCH_ROWS = 128 * 1024
+
+CARD_COLUMNS = ['Product_Link', 'Image_URL', 'Qty', 'Title', 'Brand', 'Current', 'Avg Rating', 'Category']
+
+
+def filter_expression(categories=(), brands=(), price_range=None, min_rating=0, min_qty=0, search=()):
+    """Dataset filter expression equivalent to the sidebar filters"""
+    expression = pc.scalar(True)
+    if search:
+        # Same semantics as SearchIndex: long terms match anywhere in a word, short ones word prefixes
+        title = pc.utf8_lower(pc.field('Title'))
+        for term in search:
+            if len(term) >= NGRAM:
+                expression &= pc.match_substring(title, term)
+            else:
+                expression &= pc.match_substring_regex(title, f"(^|[^0-9a-z]){term}")
+    if categories:
+        expression &= pc.field('Category').isin(list(categories))
+    if brands:
+        expression &= pc.field('Brand').isin(list(brands))
+    if price_range is not None:
+        expression &= (pc.field('Current') >= price_range[0]) & (pc.field('Current') <= price_range[1])
+    if min_rating:
+        expression &= pc.field('Avg Rating') >= min_rating
+    if min_qty:
+        expression &= pc.field('Qty') >= min_qty
+    return expression
+
+
+def _ceil_div(numerator, denominator):
+    return -((-numerator) // denominator)
+
+
+def mixed_positions(counts, brand, ranks, weighted=False):
+    """Positions in the Mixed Brands interleave of the given ranks of one brand
+
+    Matches shuffle_mixed_brands: products are ordered by (key, brand order),
+    where key is the rank within the brand, or (rank + 0.5) / brand size when
+    weighted. Exact integer arithmetic keeps ties identical to the in-memory sort.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    ranks = np.asarray(ranks, dtype=np.int64)[:, None]
+    own = counts[brand]
+
+    if not weighted:
+        before = np.minimum(counts[None, :], ranks).sum(axis=1)
+        ties = (counts[None, :brand] > ranks).sum(axis=1)
+        return before + ties
+
+    # Key (2r + 1) / (2 c); products of brand b sorted before it satisfy
+    # (2r' + 1) * own < (2r + 1) * c_b
+    scaled = (2 * ranks + 1) * counts[None, :]
+    before = np.clip(_ceil_div(scaled - own, 2 * own), 0, counts[None, :]).sum(axis=1)
+    # Earlier brands with a product on exactly the same key come first
+    earlier = scaled[:, :brand]
+    quotient = earlier // own
+    ties = ((earlier % own == 0) & (quotient % 2 == 1) & ((quotient - 1) // 2 < counts[None, :brand])).sum(axis=1)
+    return before + ties
+
+
+def _first_rank_at(counts, brand, position, weighted):
+    """Smallest rank of brand whose interleave position is >= position"""
+    low, high = 0, int(counts[brand])
+    while low < high:
+        middle = (low + high) // 2
+        if mixed_positions(counts, brand, [middle], weighted)[0] < position:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def catalog_fingerprint(source):
+    """Hash of the paths, sizes and mtimes of a Parquet file or directory's data files
+
+    Only stats the files, so it is cheap enough to check on every rerun.
+    Files skipped by pyarrow datasets (names starting with '.' or '_') are
+    skipped here too.
+    """
+    source = Path(source)
+    paths = sorted(
+        path for path in source.rglob('*')
+        if path.is_file() and not any(part.startswith(('.', '_')) for part in path.relative_to(source).parts)
+    ) if source.is_dir() else [source]
+    digest = hashlib.blake2b(digest_size=20)
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+class ArrowCatalog:
+    """Sidebar filters, brand aggregations and gallery pages as streaming Parquet scans
+
+    Only the columns a query needs are read, batch by batch, so memory scales
+    with the batch and page size instead of the catalog size.
+    """
+
+    def __init__(self, source):
+        self.source = Path(source)
+        self.dataset_hash = catalog_fingerprint(self.source)
+        self.dataset = ds.dataset(self.source, format='parquet')
+
+    def _batches(self, columns, expression=None):
+        scanner = self.dataset.scanner(columns=columns, filter=expression, batch_size=SCAN_BATCH_ROWS)
+        for batch in scanner.to_batches():
+            if not batch.num_rows:
+                continue
+            # Categorical columns are stored dictionary-encoded; compute kernels want plain values
+            columns = [
+                column.dictionary_decode() if pa.types.is_dictionary(column.type) else column
+                for column in batch.columns
+            ]
+            yield pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+    # ---------- sidebar ----------
+    def count(self, expression=None):
+        return self.dataset.count_rows(filter=expression)
+
+    def categories(self):
+        values = set()
+        for batch in self._batches(['Category']):
+            values.update(pc.unique(batch.column('Category')).to_pylist())
+        return sorted(value for value in values if value is not None)
+
+    def facets(self, categories=()):
+        """Brands with their product counts and value bounds of the rows left by the category filter alone"""
+        brand_counts = Counter()
+        min_price, max_price, max_qty = None, None, None
+        for batch in self._batches(['Brand', 'Current', 'Qty'], filter_expression(categories=categories)):
+            counts = pc.value_counts(batch.column('Brand'))
+            brand_counts.update(dict(zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist())))
+            price_bounds = pc.min_max(batch.column('Current')).as_py()
+            batch_max_qty = pc.max(batch.column('Qty')).as_py()
+            min_price = price_bounds['min'] if min_price is None else min(min_price, price_bounds['min'])
+            max_price = price_bounds['max'] if max_price is None else max(max_price, price_bounds['max'])
+            max_qty = batch_max_qty if max_qty is None else max(max_qty, batch_max_qty)
+
+        brand_counts.pop(None, None)
+        return {
+            'brands': sorted(brand_counts),
+            'brand_counts': dict(brand_counts),
+            'min_price': float(min_price or 0),
+            'max_price': float(max_price or 0),
+            'max_qty': int(max_qty or 0)
+        }
+
+    # ---------- aggregations ----------
+    def brand_metrics(self, expression, brands):
+        """calculate_metrics() over a scan: per-batch partial aggregates merged per brand"""
+        partials = []
+        for batch in self._batches(['Brand', 'Current', 'Qty', 'Avg Rating'], expression):
+            table = pa.Table.from_batches([batch])
+            table = table.append_column('rated', pc.cast(pc.greater(table.column('Avg Rating'), 0), pa.int64()))
+            partials.append(table.group_by('Brand').aggregate([
+                ('Current', 'sum'), ('Current', 'min'), ('Current', 'max'), ('Current', 'count'),
+                ('Qty', 'sum'), ('Avg Rating', 'sum'), ('rated', 'sum')
+            ]).to_pandas())
+
+        empty_metrics = {
+            'avg_price': 0, 'min_price': 0, 'max_price': 0, 'total_products': 0,
+            'total_qty': 0, 'avg_qty_per_product': 0, 'avg_rating': 0, 'rating_count': 0
+        }
+        metrics = {brand: dict(empty_metrics) for brand in brands}
+        if not partials:
+            return metrics
+
+        stats = pd.concat(partials).groupby('Brand').agg({
+            'Current_sum': 'sum', 'Current_min': 'min', 'Current_max': 'max', 'Current_count': 'sum',
+            'Qty_sum': 'sum', 'Avg Rating_sum': 'sum', 'rated_sum': 'sum'
+        })
+        for brand, row in stats.iterrows():
+            if brand not in metrics:
+                continue
+            total_products = int(row['Current_count'])
+            metrics[brand] = {
+                'avg_price': round(float(row['Current_sum']) / total_products, 2),
+                'min_price': round(float(row['Current_min']), 2),
+                'max_price': round(float(row['Current_max']), 2),
+                'total_products': total_products,
+                'total_qty': int(row['Qty_sum']),
+                'avg_qty_per_product': round(int(row['Qty_sum']) / total_products, 1),
+                'avg_rating': round(float(row['Avg Rating_sum']) / total_products, 1),
+                'rating_count': int(row['rated_sum'])
+            }
+        return metrics
+
+    def summary(self, expression):
+        """summarize() over a scan; the Qty median is exact, from merged value counts"""
+        price_sum, total = 0.0, 0
+        qty_counts = []
+        for batch in self._batches(['Current', 'Qty'], expression):
+            price_sum += pc.sum(batch.column('Current'), min_count=0).as_py() or 0.0
+            total += batch.num_rows
+            counts = pc.value_counts(batch.column('Qty'))
+            qty_counts.append(pd.Series(
+                counts.field('counts').to_numpy(), index=counts.field('values').to_numpy()
+            ))
+
+        median_qty = np.nan
+        if total:
+            merged = pd.concat(qty_counts).groupby(level=0).sum().sort_index()
+            cumulative = merged.cumsum().to_numpy()
+            values = merged.index.to_numpy()
+            low = values[np.searchsorted(cumulative, (total - 1) // 2 + 1)]
+            high = values[np.searchsorted(cumulative, total // 2 + 1)]
+            median_qty = (low + high) / 2
+
+        return {
+            'avg_price': price_sum / total if total else np.nan,
+            'median_qty': median_qty,
+            'total_products': total
+        }
+
+    # ---------- gallery pages ----------
+    def page(self, expression, start, stop, sort_keys=None, brand_counts=None, weighted=False):
+        """Rows [start, stop) of the filtered catalog in gallery order, as pandas
+
+        sort_keys are (column, ascending) pairs as in SORT_KEYS; without them the
+        rows are interleaved across the brands of brand_counts, in that order.
+        """
+        if stop <= start:
+            return pd.DataFrame(columns=CARD_COLUMNS)
+        if sort_keys is not None:
+            return self._sorted_page(expression, sort_keys, start, stop)
+        return self._mixed_page(expression, brand_counts, start, stop, weighted)
+
+    def _sorted_page(self, expression, keys, start, stop):
+        # Keep only the best `stop` rows seen so far; the scan ordinal breaks ties
+        sort_keys = [(column, 'ascending' if ascending else 'descending') for column, ascending in keys]
+        sort_keys.append(('_ordinal', 'ascending'))
+
+        best = None
+        ordinal = 0
+        for batch in self._batches(CARD_COLUMNS, expression):
+            table = pa.Table.from_batches([batch])
+            table = table.append_column('_ordinal', pa.array(np.arange(ordinal, ordinal + table.num_rows)))
+            ordinal += table.num_rows
+            if best is not None:
+                table = pa.concat_tables([best, table])
+            best = table.take(pc.sort_indices(table, sort_keys=sort_keys)[:stop])
+
+        if best is None:
+            return pd.DataFrame(columns=CARD_COLUMNS)
+        return best.slice(start, stop - start).drop_columns(['_ordinal']).to_pandas()
+
+    def _mixed_page(self, expression, brand_counts, start, stop, weighted):
+        brands = list(brand_counts)
+        counts = np.array([brand_counts[brand] for brand in brands], dtype=np.int64)
+
+        # Rank range of every brand that lands inside [start, stop)
+        rank_ranges = [
+            (_first_rank_at(counts, idx, start, weighted), _first_rank_at(counts, idx, stop, weighted))
+            for idx in range(len(brands))
+        ]
+
+        seen = np.zeros(len(brands), dtype=np.int64)
+        kept = []
+        for batch in self._batches(CARD_COLUMNS, expression):
+            brand_index = pc.index_in(batch.column('Brand'), value_set=pa.array(brands)).to_numpy(zero_copy_only=False)
+            brand_index = np.nan_to_num(brand_index.astype(float), nan=-1).astype(np.int64)
+            in_selection = brand_index >= 0
+
+            # Running rank of each product within its brand, across batches
+            ranks = np.full(len(brand_index), -1, dtype=np.int64)
+            ranks[in_selection] = pd.Series(brand_index[in_selection]).groupby(
+                brand_index[in_selection]).cumcount().to_numpy() + seen[brand_index[in_selection]]
+            seen += np.bincount(brand_index[in_selection], minlength=len(brands))
+
+            lows = np.array([low for low, _ in rank_ranges])[brand_index.clip(0)]
+            highs = np.array([high for _, high in rank_ranges])[brand_index.clip(0)]
+            keep = in_selection & (ranks >= lows) & (ranks < highs)
+            if keep.any():
+                rows = batch.filter(pa.array(keep)).to_pandas()
+                rows['_brand'] = brand_index[keep]
+                rows['_rank'] = ranks[keep]
+                kept.append(rows)
+
+        if not kept:
+            return pd.DataFrame(columns=CARD_COLUMNS)
+
+        page_df = pd.concat(kept, ignore_index=True)
+        page_df['_position'] = 0
+        for idx, group in page_df.groupby('_brand'):
+            page_df.loc[group.index, '_position'] = mixed_positions(counts, idx, group['_rank'].to_numpy(), weighted)
+        page_df = page_df.sort_values('_position')
+        return page_df[CARD_COLUMNS].reset_index(drop=True)
+
+
+class ArrowFilterEngine:
+    """FilterEngine counterpart for ArrowCatalog: predicates build a scan expression"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.dataset_hash = catalog.dataset_hash
+        self.filters = {}
+        self._facets = {}
+
+    def categories(self):
+        if 'categories' not in self._facets:
+            self._facets['categories'] = self.catalog.categories()
+        return self._facets['categories']
+
+    def filter_categories(self, categories):
+        self.filters['categories'] = tuple(categories)
+
+    def filter_brands(self, brands):
+        self.filters['brands'] = tuple(brands)
+
+    def filter_price(self, price_range):
+        self.filters['price_range'] = tuple(price_range)
+
+    def filter_min_rating(self, min_rating):
+        self.filters['min_rating'] = min_rating
+
+    def filter_min_qty(self, min_qty):
+        self.filters['min_qty'] = min_qty
+
+    def filter_search(self, query, get_index=None):
+        # Scans match titles directly, so no index is needed
+        self.filters['search'] = tuple(tokenize(query))
+
+    def category_facets(self, categories):
+        key = ('facets', tuple(categories))
+        if key not in self._facets:
+            self._facets[key] = self.catalog.facets(categories)
+        return self._facets[key]
+
+    def filter_state(self):
+        """Hashable snapshot of the current predicates"""
+        return tuple(sorted(self.filters.items()))
+
+    def mask(self):
+        return filter_expression(**self.filters)
@@ -0,0 +1,193 @@
+"""Stage-by-stage timings of the dashboard pipeline on synthetic catalogs
+
+    python benchmark.py --rows 10000 100000 1000000 --output bench.json
+    python benchmark.py --rows 100000 --baseline bench.json
+
+Every stage is timed --repeat times and the median is reported. Results are
+written as JSON. With --baseline, the run exits non-zero if any stage got
+slower than the baseline by more than --tolerance.
+"""
+import argparse
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core import (
+    FilterEngine, SortIndex, SORT_KEYS, TOPK_SORTS, TopKOrder, apply_sorting, calculate_metrics,
+    check_required_columns, clean_data, compute_badges, parse_source, shuffle_mixed_brands, standardize_columns,
+    summarize
+)
+from gallery_html import gallery_rows, product_cards_html
+from image_cache import ImageCache
+from metrics_cube import MetricsCube
+from synthetic_data import generate_catalog
+
+PAGE_SIZE = 60
+SELECTED_BRANDS = 4
+LATER_PAGE = 10
+# Sorts the app serves from a SortIndex permutation; the rest go through TopKOrder
+PERMUTATION_SORTS = [sort_by for sort_by in SORT_KEYS if sort_by not in TOPK_SORTS]
+
+
+def timed(function, repeat):
+    """Median and minimum wall time of function() over repeat runs"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return float(np.median(durations)), float(min(durations))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stages(raw, csv_bytes):
+    """(name, callable) for every pipeline stage, run on one generated catalog"""
+    df = parse_source(io.BytesIO(csv_bytes), 'catalog.csv')
+    df.attrs['dataset_hash'] = 'benchmark'
+    brands = df['Brand'].value_counts().index[:SELECTED_BRANDS].tolist()
+    categories = sorted(df['Category'].unique().tolist())[:-1]
+    price_range = (float(df['Current'].quantile(0.05)), float(df['Current'].quantile(0.95)))
+
+    def filters():
+        engine = FilterEngine(df)
+        engine.filter_categories(categories)
+        engine.filter_brands(brands)
+        engine.filter_price(price_range)
+        engine.filter_min_rating(1.0)
+        engine.filter_min_qty(1)
+        return engine.apply()
+
+    def column_mapping():
+        mapped = standardize_columns(raw.astype(str))
+        check_required_columns(mapped.columns)
+        return clean_data(mapped)
+
+    filtered_df = filters()
+    summary = summarize(filtered_df)
+    sort_index = SortIndex(df, PERMUTATION_SORTS)
+    mask = df['Brand'].isin(brands).to_numpy()
+    positions = np.flatnonzero(mask)
+    page_df = df.iloc[TopKOrder.for_sort(df, positions, 'Price (High to Low)')[:PAGE_SIZE]]
+    badges = compute_badges(page_df, summary)
+    cube = MetricsCube(df)
+    # Never populated, so every card pays the thumbnail lookup and falls back to its URL
+    image_cache = ImageCache(root=Path(tempfile.gettempdir()) / 'benchmark-thumbnails')
+    later_page = slice((LATER_PAGE - 1) * PAGE_SIZE, LATER_PAGE * PAGE_SIZE)
+
+    return [
+        ('ingest', lambda: parse_source(io.BytesIO(csv_bytes), 'catalog.csv')),
+        ('column_mapping', column_mapping),
+        ('filters', filters),
+        ('calculate_metrics', lambda: calculate_metrics(filtered_df, brands)),
+        ('metrics_cube_build', lambda: MetricsCube(df)),
+        ('metrics_cube_rollup', lambda: cube.rollup(categories, brands, price_range, 1.0, 1)),
+        ('shuffle_mixed_brands', lambda: shuffle_mixed_brands(filtered_df, brands)),
+        ('shuffle_mixed_brands_weighted', lambda: shuffle_mixed_brands(filtered_df, brands, weighted=True)),
+        *[(f"apply_sorting[{sort_by}]", lambda sort_by=sort_by: apply_sorting(filtered_df, sort_by))
+          for sort_by in SORT_KEYS],
+        ('sort_index_build', lambda: SortIndex(df, PERMUTATION_SORTS)),
+        ('pagination', lambda: df.iloc[sort_index.positions('Brand A-Z', mask)[later_page]]),
+        ('topk_first_page', lambda: df.iloc[
+            TopKOrder.for_sort(df, positions, 'Price (High to Low)')[:PAGE_SIZE]
+        ]),
+        ('topk_later_page', lambda: df.iloc[
+            TopKOrder.for_sort(df, positions, 'Price (High to Low)')[later_page]
+        ]),
+        ('card_html', lambda: product_cards_html(page_df, badges, '$', image_cache=image_cache)),
+        ('gallery_slice_json', lambda: json.dumps(gallery_rows(page_df, badges, image_cache)))
+    ]
+
+
+def run(rows_list, repeat, generator_args):
+    results = []
+    for rows in rows_list:
+        raw = generate_catalog(rows, **generator_args)
+        csv_bytes = raw.to_csv(index=False).encode()
+        for stage, function in stages(raw, csv_bytes):
+            median, minimum = timed(function, repeat)
+            results.append({'rows': rows, 'stage': stage, 'median_s': median, 'min_s': minimum,
+                            'repeat': repeat})
+            print(f"{rows:>10,} rows  {stage:<45} {median * 1000:10.2f} ms", file=sys.stderr)
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """Stages slower than the baseline run by more than tolerance (a fraction)"""
+    previous = {(r['rows'], r['stage']): r['median_s'] for r in baseline['results']}
+    slower = []
+    for result in results:
+        before = previous.get((result['rows'], result['stage']))
+        if before and result['median_s'] > before * (1 + tolerance):
+            slower.append({**result, 'baseline_s': before, 'ratio': result['median_s'] / before})
+    return slower
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--brands', type=int, default=12)
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--missing-image-rate', type=float, default=0.05)
+    parser.add_argument('--zero-qty-rate', type=float, default=0.1)
+    parser.add_argument('--output', default='-', help="JSON results file ('-' for stdout)")
+    parser.add_argument('--baseline', help="Earlier results JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown against the baseline, as a fraction")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    generator_args = {
+        'n_brands': args.brands, 'n_categories': args.categories, 'zipf_s': args.zipf,
+        'missing_image_rate': args.missing_image_rate, 'zero_qty_rate': args.zero_qty_rate
+    }
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'generator': generator_args,
+        'results': run(args.rows, args.repeat, generator_args)
+    }
+
+    exit_code = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        report['baseline_revision'] = baseline.get('revision')
+        report['regressions'] = regressions(report['results'], baseline, args.tolerance)
+        for slower in report['regressions']:
+            print(f"REGRESSION {slower['rows']:,} rows {slower['stage']}: "
+                  f"{slower['ratio']:.2f}x baseline", file=sys.stderr)
+        exit_code = 1 if report['regressions'] else 0
+
+    output = json.dumps(report, indent=1)
+    if args.output == '-':
+        print(output)
+    else:
+        Path(args.output).write_text(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
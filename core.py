@@ -0,0 +1,613 @@
+"""Dashboard analysis that runs without Streamlit: loading, metrics, sorting and filters
+
+app.py renders these results; report.py runs them headless for batch jobs.
+"""
+import threading
+from contextlib import nullcontext
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.api.types import union_categoricals
+
+from dataset_cache import hash_file
+from search_index import tokenize
+
+# ========== DATA LOADING ==========
+REQUIRED_COLUMNS = ['Product_Link', 'Image_URL', 'Qty', 'Title', 'Brand', 'Current', 'Avg Rating']
+
+CSV_CHUNK_ROWS = 100_000
+XLSX_CHUNK_ROWS = 50_000
+
+# Store Title and the URL columns as Arrow-backed strings instead of Python objects
+ARROW_STRINGS = False
+
+class MissingColumnsError(ValueError):
+    """Raised when an input file lacks one of the required columns"""
+    def __init__(self, missing_columns):
+        super().__init__(f"Missing required columns: {', '.join(missing_columns)}")
+        self.missing_columns = missing_columns
+
+def is_csv_source(file_path):
+    """Tell CSV inputs apart from Excel workbooks by file name"""
+    name = getattr(file_path, 'name', None) or str(file_path)
+    return name.lower().endswith('.csv')
+
+def is_xlsx_source(file_path):
+    """Workbooks openpyxl can stream; legacy .xls still goes through pd.read_excel"""
+    name = getattr(file_path, 'name', None) or str(file_path)
+    return name.lower().endswith(('.xlsx', '.xlsm'))
+
+def open_source(file_path):
+    """Open a path or an uploaded file as a seekable binary stream"""
+    if isinstance(file_path, (str, Path)):
+        return open(file_path, 'rb')
+    return nullcontext(file_path)
+
+def build_column_mapping(columns):
+    """Map raw (stripped) column names onto the dashboard's standard names"""
+    column_mapping = {}
+    for col in columns:
+        col_lower = col.lower()
+        if 'image' in col_lower or 'img' in col_lower:
+            column_mapping[col] = 'Image_URL'
+        elif 'link' in col_lower or 'url' in col_lower:
+            column_mapping[col] = 'Product_Link'
+        elif 'qty' in col_lower or 'quantity' in col_lower or 'sold' in col_lower:
+            column_mapping[col] = 'Qty'
+        elif 'title' in col_lower or 'name' in col_lower or 'product' in col_lower:
+            column_mapping[col] = 'Title'
+        elif 'brand' in col_lower:
+            column_mapping[col] = 'Brand'
+        elif 'current' in col_lower or 'price' in col_lower:
+            column_mapping[col] = 'Current'
+        elif 'rating' in col_lower or 'avg rating' in col_lower:
+            column_mapping[col] = 'Avg Rating'
+        elif 'category' in col_lower:
+            column_mapping[col] = 'Category'
+    
+    return column_mapping
+
+def check_required_columns(columns):
+    """Raise MissingColumnsError if any required standard column is absent"""
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise MissingColumnsError(missing_columns)
+
+def standardize_columns(df):
+    """Strip and map raw column names onto the dashboard's standard names"""
+    # Clean column names
+    df.columns = df.columns.str.strip()
+    
+    # Standardize column names
+    return df.rename(columns=build_column_mapping(df.columns))
+
+def clean_data(df):
+    """Coerce the standardized columns to clean, typed values"""
+    # Clean data
+    df['Brand'] = df['Brand'].astype(str).str.strip()
+    df['Title'] = df['Title'].astype(str).str.strip()
+    
+    # Handle Category column (optional)
+    if 'Category' in df.columns:
+        df['Category'] = df['Category'].astype(str).str.strip()
+        df['Category'] = df['Category'].fillna('Uncategorized')
+    else:
+        df['Category'] = 'Uncategorized'
+    
+    # Convert price to numeric (USD)
+    df['Current'] = pd.to_numeric(
+        df['Current'].astype(str)
+        .str.replace('$', '', regex=False)
+        .str.replace(',', '', regex=False)
+        .str.replace('USD', '', regex=False)
+        .str.strip(), 
+        errors='coerce'
+    ).fillna(0)
+    
+    # Convert Qty to numeric - fix for sorting
+    df['Qty'] = pd.to_numeric(df['Qty'], errors='coerce')
+    # Fill NaN values with 0 and convert to int
+    df['Qty'] = df['Qty'].fillna(0).astype(int)
+    
+    # Convert Avg Rating to numeric
+    df['Avg Rating'] = pd.to_numeric(df['Avg Rating'], errors='coerce').fillna(0)
+    
+    # Clean URLs
+    df['Product_Link'] = df['Product_Link'].astype(str).str.strip()
+    df['Image_URL'] = df['Image_URL'].astype(str).str.strip()
+    
+    # Remove rows with missing essential data
+    df = df.dropna(subset=['Brand', 'Title', 'Current']).reset_index(drop=True)
+    
+    return df
+
+def read_csv_chunked(source, chunk_rows=CSV_CHUNK_ROWS):
+    """Stream a CSV in chunks, mapping, cleaning and compacting each chunk as it is read
+
+    Only compact chunks are kept, so peak memory is about the final frame
+    plus one raw chunk.
+    """
+    # Map the header alone so only the needed columns are ever parsed
+    raw_columns = pd.read_csv(source, nrows=0).columns
+    source.seek(0)
+    column_mapping = build_column_mapping([col.strip() for col in raw_columns])
+    rename = {col: column_mapping[col.strip()] for col in raw_columns if col.strip() in column_mapping}
+    check_required_columns(set(rename.values()))
+    
+    chunks = []
+    reader = pd.read_csv(
+        source,
+        usecols=list(rename),
+        dtype=str,
+        chunksize=chunk_rows,
+        encoding_errors='replace'
+    )
+    for chunk in reader:
+        chunks.append(compact_schema(clean_data(chunk.rename(columns=rename))))
+    
+    if not chunks:
+        return compact_schema(clean_data(pd.DataFrame(columns=list(rename.values()))))
+    
+    return concat_compact(chunks)
+
+@lru_cache(maxsize=64)
+def header_mapping(header):
+    """(column index, standard name) pairs for a raw header row, learned once per header signature"""
+    column_mapping = build_column_mapping([col for col in header if col])
+    mapped = {}
+    for index, col in enumerate(header):
+        # The first raw column wins if two map onto the same standard name
+        if col in column_mapping and column_mapping[col] not in mapped:
+            mapped[column_mapping[col]] = index
+    return tuple((index, name) for name, index in mapped.items())
+
+def _xlsx_chunk(rows, names):
+    chunk = pd.DataFrame(rows, columns=names, dtype=object)
+    # Empty cells come back as None; make them NaN as pd.read_excel does
+    return compact_schema(clean_data(chunk.where(chunk.notna(), np.nan)))
+
+def read_xlsx_streaming(source, chunk_rows=XLSX_CHUNK_ROWS):
+    """Stream the first sheet of a workbook, reading only the mapped columns
+
+    The header row is mapped before any data row is parsed, so a workbook
+    without the required columns fails straight away. Rows are then read
+    in openpyxl's read-only mode, in chunks that are cleaned and compacted
+    as they fill.
+    """
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        header = tuple('' if col is None else str(col).strip() for col in header)
+        mapping = header_mapping(header)
+        check_required_columns({name for _, name in mapping})
+        
+        indices = [index for index, _ in mapping]
+        names = [name for _, name in mapping]
+        first = min(indices)
+        offsets = [index - first for index in indices]
+        
+        chunks = []
+        rows = []
+        for row in sheet.iter_rows(min_row=2, min_col=first + 1, max_col=max(indices) + 1, values_only=True):
+            values = [row[offset] if offset < len(row) else None for offset in offsets]
+            # Rows blank in every mapped column are dropped. pd.read_excel kept blank rows
+            # between data rows, which clean_data turned into 'nan' products
+            if all(value is None for value in values):
+                continue
+            rows.append(values)
+            if len(rows) >= chunk_rows:
+                chunks.append(_xlsx_chunk(rows, names))
+                rows = []
+        if rows or not chunks:
+            chunks.append(_xlsx_chunk(rows, names))
+    finally:
+        workbook.close()
+    
+    return concat_compact(chunks)
+
+def compact_schema(df, arrow_strings=ARROW_STRINGS):
+    """Store the catalog in compact dtypes: categoricals, float32 and the smallest int"""
+    df = df.copy()
+    df['Brand'] = df['Brand'].astype('category')
+    df['Category'] = df['Category'].astype('category')
+    df['Current'] = df['Current'].astype('float32')
+    df['Avg Rating'] = df['Avg Rating'].astype('float32')
+    df['Qty'] = pd.to_numeric(df['Qty'], downcast='integer')
+    
+    if arrow_strings:
+        for column in ['Title', 'Product_Link', 'Image_URL']:
+            df[column] = df[column].astype('string[pyarrow]')
+    
+    return df
+
+def concat_compact(chunks):
+    """Concatenate chunks already in compact_schema dtypes into one compact frame
+
+    Each chunk's categoricals only know their own values, so they are
+    recoded onto the merged, sorted categories first; concatenating
+    categoricals that differ would fall back to object columns.
+    """
+    for column in ['Brand', 'Category']:
+        categories = union_categoricals([chunk[column] for chunk in chunks], sort_categories=True).categories
+        for chunk in chunks:
+            chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+def memory_report(df):
+    """Per-column memory of the compact layout against the plain object/64-bit layout"""
+    rows = []
+    for column in df.columns:
+        compact = df[column]
+        if isinstance(compact.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(compact.dtype):
+            wide = compact.astype(object)
+        elif pd.api.types.is_float_dtype(compact.dtype):
+            wide = compact.astype('float64')
+        elif pd.api.types.is_integer_dtype(compact.dtype):
+            wide = compact.astype('int64')
+        else:
+            wide = compact
+        rows.append({
+            'Column': column,
+            'Plain dtype': str(wide.dtype),
+            'Plain MB': wide.memory_usage(deep=True, index=False) / 1024 ** 2,
+            'Compact dtype': str(compact.dtype),
+            'Compact MB': compact.memory_usage(deep=True, index=False) / 1024 ** 2
+        })
+    
+    report = pd.DataFrame(rows)
+    totals = {'Column': 'Total', 'Plain dtype': '', 'Compact dtype': '',
+              'Plain MB': report['Plain MB'].sum(), 'Compact MB': report['Compact MB'].sum()}
+    report = pd.concat([report, pd.DataFrame([totals])], ignore_index=True)
+    report['Saved %'] = (1 - report['Compact MB'] / report['Plain MB']) * 100
+    
+    return report.round(2)
+
+def parse_source(source, file_path):
+    """Parse an open CSV or Excel source into the cleaned, compact catalog"""
+    # The streaming readers compact chunk by chunk
+    if is_csv_source(file_path):
+        return read_csv_chunked(source)
+    if is_xlsx_source(file_path):
+        return read_xlsx_streaming(source)
+    
+    df = standardize_columns(pd.read_excel(source))
+    check_required_columns(df.columns)
+    return compact_schema(clean_data(df))
+
+def load_dataset(file_path, cache=None):
+    """Load a data file outside Streamlit, through a DatasetCache when one is given"""
+    with open_source(file_path) as source:
+        digest = hash_file(source)
+        df = cache.get(digest) if cache is not None else None
+        if df is None:
+            df = parse_source(source, file_path)
+            if cache is not None:
+                cache.put(digest, df)
+    
+    df.attrs['dataset_hash'] = digest
+    return df
+
+# ========== ANALYSIS ==========
+MIXED_SORT_OPTIONS = ('Mixed Brands', 'Mixed Brands (Weighted)')
+
+# Sort keys per gallery sort option, as (column, ascending) pairs. Brand
+# sorts order by Title within each brand so Brand Columns need no re-sort.
+SORT_KEYS = {
+    'Price (High to Low)': [('Current', False)],
+    'Price (Low to High)': [('Current', True)],
+    'Rating (High to Low)': [('Avg Rating', False)],
+    'Quantity Sold (High to Low)': [('Qty', False)],
+    'Brand A-Z': [('Brand', True), ('Title', True)],
+    'Brand Z-A': [('Brand', False), ('Title', False)]
+}
+
+def calculate_metrics(df, brands):
+    """Calculate key metrics for selected brands"""
+    # One grouped pass over the rows instead of a mask scan per brand. Prices and
+    # ratings are widened to float64 first: float32 means round differently
+    # (4.549999952 -> 4.6 instead of 4.5)
+    stats = (
+        df[['Brand', 'Qty']]
+        .assign(
+            Current=df['Current'].astype('float64'),
+            rating=df['Avg Rating'].astype('float64'),
+            rated=df['Avg Rating'] > 0
+        )
+        .groupby('Brand', sort=False, observed=True)
+        .agg(
+            avg_price=('Current', 'mean'),
+            min_price=('Current', 'min'),
+            max_price=('Current', 'max'),
+            total_products=('Current', 'size'),
+            total_qty=('Qty', 'sum'),
+            avg_rating=('rating', 'mean'),
+            rating_count=('rated', 'sum')
+        )
+    )
+    price_columns = ['avg_price', 'min_price', 'max_price']
+    stats[price_columns] = stats[price_columns].round(2)
+    stats['avg_rating'] = stats['avg_rating'].round(1)
+    stats['avg_qty_per_product'] = (stats['total_qty'] / stats['total_products']).round(1)
+    
+    empty_metrics = {
+        'avg_price': 0,
+        'min_price': 0,
+        'max_price': 0,
+        'total_products': 0,
+        'total_qty': 0,
+        'avg_qty_per_product': 0,
+        'avg_rating': 0,
+        'rating_count': 0
+    }
+    
+    metrics = {}
+    present = stats.index.intersection(brands)
+    rows = stats.loc[present].to_dict('index')
+    
+    for brand in brands:
+        row = rows.get(brand)
+        if row is None:
+            metrics[brand] = dict(empty_metrics)
+            continue
+        metrics[brand] = {key: row[key] for key in empty_metrics}
+    
+    return metrics
+
+def summarize(filtered_df):
+    """Summary statistics of one filter state, shared by the metrics tab and the gallery"""
+    return {
+        'avg_price': filtered_df['Current'].astype('float64').mean(),
+        'median_qty': filtered_df['Qty'].median(),
+        'total_products': len(filtered_df)
+    }
+
+# Badge code -> (css class, label) pairs shown on a product card
+BADGES = {
+    0: [],
+    1: [('badge-premium', 'PREMIUM')],
+    2: [('badge-best', 'TOP RATED')],
+    3: [('badge-value', 'BEST SELLER')],
+    4: [('badge-soldout', 'NEW')]
+}
+
+def compute_badges(filtered_df, summary):
+    """Badge code for every filtered product, first matching rule wins"""
+    codes = np.select(
+        [
+            filtered_df['Current'] > summary['avg_price'] * 1.2,
+            filtered_df['Avg Rating'] >= 4.5,
+            filtered_df['Qty'] > summary['median_qty'] * 2,
+            filtered_df['Qty'] == 0
+        ],
+        [1, 2, 3, 4],
+        default=0
+    )
+    return pd.Series(codes, index=filtered_df.index)
+
+def shuffle_mixed_brands(df, brands, weighted=False):
+    """Interleave products across brands - ONLY for Mixed Brands sort options
+    
+    Products are taken round-robin in the order of `brands`, keeping each
+    brand's own row order. With weighted=True every brand is instead spread
+    evenly over the whole ordering, so brands appear in proportion to their
+    share of the products.
+    """
+    brand_position = pd.Index(list(dict.fromkeys(brands))).get_indexer(df['Brand'])
+    selected = brand_position >= 0
+    
+    if not selected.any():
+        return df.copy()
+    
+    mixed_df = df[selected]
+    brand_position = brand_position[selected]
+    
+    # Rank of each product within its brand, in the brand's original row order
+    brand_groups = mixed_df.groupby('Brand', sort=False, observed=True)['Brand']
+    rank = brand_groups.cumcount().to_numpy()
+    if weighted:
+        rank = (rank + 0.5) / brand_groups.transform('size').to_numpy()
+    
+    # Stable sort on (rank, brand order) reproduces the round-robin interleave
+    order = np.lexsort((brand_position, rank))
+    
+    return mixed_df.iloc[order]
+
+def sort_permutation(df, keys):
+    """Row positions of df in stable order by a list of (column, ascending) keys"""
+    sort_columns = []
+    # np.lexsort treats its last key as the primary one
+    for column, ascending in reversed(keys):
+        codes = pd.factorize(df[column], sort=True)[0]
+        sort_columns.append(codes if ascending else -codes)
+    return np.lexsort(sort_columns)
+
+def apply_sorting(df, sort_by):
+    """Apply sorting based on the selected sort option"""
+    # Mixed Brands will be handled separately
+    if sort_by not in SORT_KEYS:
+        return df.reset_index(drop=True)
+    
+    return df.iloc[sort_permutation(df, SORT_KEYS[sort_by])].reset_index(drop=True)
+
+class SortIndex:
+    """Sort permutations of one loaded dataset, built once for every sort option"""
+    
+    def __init__(self, df, sort_options=None):
+        self.permutations = {
+            sort_by: sort_permutation(df, SORT_KEYS[sort_by]) for sort_by in (sort_options or SORT_KEYS)
+        }
+    
+    def positions(self, sort_by, mask):
+        """Positions of the rows selected by a boolean mask, in sort_by order"""
+        permutation = self.permutations[sort_by]
+        return permutation[mask[permutation]]
+
+# Single numeric key sorts served by partial selection instead of a full permutation
+TOPK_SORTS = ('Price (High to Low)', 'Price (Low to High)', 'Rating (High to Low)', 'Quantity Sold (High to Low)')
+TOPK_INITIAL = 256
+
+class TopKOrder:
+    """Filtered positions in sort order, selected lazily page by page
+    
+    Slicing only orders the rows up to the slice end: np.argpartition picks
+    the top k in O(n), every row tied with the k-th key joins them, and a
+    stable sort of that small set gives exactly the order of a full stable
+    sort. The ordered prefix at least doubles each time a later page asks
+    for more.
+    """
+    
+    def __init__(self, values, positions, ascending):
+        # Wide signed types so negating for descending order cannot overflow
+        keys = values.astype('float64' if values.dtype.kind == 'f' else 'int64')
+        self._keys = keys if ascending else -keys
+        self._positions = positions
+        self._order = np.empty(0, dtype=np.int64)
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def for_sort(cls, df, positions, sort_by):
+        (column, ascending), = SORT_KEYS[sort_by]
+        return cls(df[column].to_numpy()[positions], positions, ascending)
+    
+    def __len__(self):
+        return len(self._positions)
+    
+    @property
+    def nbytes(self):
+        return self._keys.nbytes + self._positions.nbytes + self._order.nbytes
+    
+    @property
+    def max_nbytes(self):
+        """Bytes held once every row is ordered, the most later pages can grow it to"""
+        return self._keys.nbytes + self._positions.nbytes + 8 * len(self._positions)
+    
+    def _extend(self, k):
+        keys = self._keys
+        k = min(len(keys), max(k, 2 * len(self._order), TOPK_INITIAL))
+        if k == len(keys):
+            return np.argsort(keys, kind='stable')
+        kth = keys[np.argpartition(keys, k - 1)[k - 1]]
+        candidates = np.flatnonzero(keys <= kth)
+        return candidates[np.argsort(keys[candidates], kind='stable')][:k]
+    
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError("TopKOrder only supports slicing")
+        start, stop, step = item.indices(len(self))
+        if stop > len(self._order):
+            with self._lock:
+                if stop > len(self._order):
+                    self._order = self._extend(stop)
+        return self._positions[self._order[start:stop:step]]
+
+def split_by_brand(df, positions, brands):
+    """Positions grouped per brand in one stable pass, keeping their order within each brand"""
+    brand_index = pd.Index(list(dict.fromkeys(brands)))
+    column = df['Brand']
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Map the category codes once instead of looking up every row's label
+        lookup = np.append(brand_index.get_indexer(column.cat.categories), -1)
+        codes = lookup[column.cat.codes.to_numpy()[positions]]
+    else:
+        codes = brand_index.get_indexer(column.to_numpy()[positions])
+    
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(brand_index) + 1))
+    grouped = positions[order]
+    return {brand: grouped[bounds[idx]:bounds[idx + 1]] for idx, brand in enumerate(brand_index)}
+
+# ========== FILTER ENGINE ==========
+class FilterEngine:
+    """Sidebar filters as cached boolean masks over one loaded dataset
+    
+    Each predicate keeps the mask for its last widget value, so moving one
+    control recomputes a single vectorized comparison and the combined mask
+    is a bitwise AND. Rows are only materialized once, by apply(). With a
+    MetricsCube, facets are rolled up from its cells instead of the rows.
+    """
+    
+    def __init__(self, df, cube=None):
+        self.df = df
+        self.dataset_hash = df.attrs['dataset_hash']
+        self.cube = cube
+        self._masks = {}
+        self._facets = None
+    
+    def _mask(self, name, value, build):
+        cached = self._masks.get(name)
+        if cached is None or cached[0] != value:
+            cached = (value, build())
+            self._masks[name] = cached
+        return cached[1]
+    
+    def _isin(self, column, values):
+        # An empty selection means no restriction, as with the category filter
+        if not values:
+            return None
+        return self.df[column].isin(values).to_numpy()
+    
+    def filter_categories(self, categories):
+        return self._mask('category', tuple(categories), lambda: self._isin('Category', categories))
+    
+    def filter_brands(self, brands):
+        return self._mask('brand', tuple(brands), lambda: self._isin('Brand', brands))
+    
+    def filter_price(self, price_range):
+        low, high = price_range
+        current = self.df['Current'].to_numpy()
+        return self._mask('price', (low, high), lambda: (current >= low) & (current <= high))
+    
+    def filter_min_rating(self, min_rating):
+        rating = self.df['Avg Rating'].to_numpy()
+        return self._mask('rating', min_rating, lambda: rating >= min_rating)
+    
+    def filter_min_qty(self, min_qty):
+        qty = self.df['Qty'].to_numpy()
+        return self._mask('qty', min_qty, lambda: qty >= min_qty)
+    
+    def filter_search(self, query, get_index):
+        """Rows matching a product search; get_index() returns the SearchIndex, only called for real queries"""
+        terms = tuple(tokenize(query))
+        return self._mask('search', terms, lambda: get_index().mask(query) if terms else None)
+    
+    def category_facets(self, categories):
+        """Brands with their product counts and value bounds left after the category filter alone"""
+        key = tuple(categories)
+        if self._facets is None or self._facets[0] != key:
+            if self.cube is not None:
+                self._facets = (key, self.cube.facets(categories))
+                return self._facets[1]
+            mask = self.filter_categories(categories)
+            subset = self.df if mask is None else self.df[mask]
+            brand_counts = subset['Brand'].value_counts()
+            brand_counts = brand_counts[brand_counts > 0]
+            facets = {
+                'brands': sorted(brand_counts.index.tolist()),
+                'brand_counts': brand_counts.to_dict(),
+                'min_price': float(subset['Current'].min()),
+                'max_price': float(subset['Current'].max()),
+                'max_qty': int(subset['Qty'].max())
+            }
+            self._facets = (key, facets)
+        return self._facets[1]
+    
+    def categories(self):
+        if self.cube is not None:
+            return self.cube.categories.tolist()
+        return sorted(self.df['Category'].unique().tolist())
+    
+    def mask(self):
+        """AND of every active predicate mask"""
+        combined = np.ones(len(self.df), dtype=bool)
+        for _, predicate_mask in self._masks.values():
+            if predicate_mask is not None:
+                combined &= predicate_mask
+        return combined
+    
+    def apply(self, mask=None):
+        """Materialize the rows selected by the combined mask"""
+        return self.df[self.mask() if mask is None else mask]
@@ -0,0 +1,87 @@
+"""Content-addressed on-disk cache of normalized datasets stored as Parquet"""
+import hashlib
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# ========== CONFIGURATION ==========
+CACHE_DIR = Path(os.environ.get("DATASET_CACHE_DIR", ".cache/datasets"))
+CACHE_MAX_BYTES = int(os.environ.get("DATASET_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+# Bump whenever the column mapping or cleaning rules in load_data change,
+# so stale normalized copies are never served for the same raw bytes
+SCHEMA_VERSION = 3
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(fileobj):
+    """Hash the raw bytes of an open binary file in blocks and rewind it"""
+    digest = hashlib.blake2b(digest_size=20)
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """Parquet files keyed by raw file hash, evicted least-recently-used first"""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def path_for(self, digest):
+        return self.root / f"v{SCHEMA_VERSION}" / f"{digest}.parquet"
+
+    def get(self, digest):
+        """Return the cached DataFrame for a digest, or None on a miss"""
+        path = self.path_for(digest)
+        if not path.exists():
+            return None
+        try:
+            df = pd.read_parquet(path, engine="pyarrow")
+        except Exception:
+            # Truncated or unreadable entry - drop it and re-parse
+            path.unlink(missing_ok=True)
+            return None
+        # Touch the entry so eviction sees it as recently used
+        now = time.time()
+        os.utime(path, (now, now))
+        return df
+
+    def put(self, digest, df):
+        """Persist a normalized DataFrame and evict old entries if over budget"""
+        path = self.path_for(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so concurrent readers never see partial files
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            df.to_parquet(tmp_path, engine="pyarrow", index=False)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Remove least-recently-used entries until the cache fits its budget"""
+        entries = []
+        for entry in self.root.glob("v*/*.parquet"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            entry.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,232 @@
+// Virtualized product grid for the dashboard's infinite-scroll gallery.
+//
+// Talks to Streamlit through the component postMessage protocol directly, so
+// the bundle is plain static files with no build step and no CDN. The server
+// sends one JSON slice of rows per render; the browser keeps recently seen
+// slices, asks for the slice it is missing through the component value, and
+// only keeps DOM nodes for the cards inside (or just around) the viewport.
+(function () {
+  "use strict";
+
+  const CARD_HEIGHT = 500;
+  const GAP = 16;
+  const MIN_CARD_WIDTH = 220;
+  const OVERSCAN_ROWS = 2;       // card rows rendered above and below the viewport
+  const MAX_SLICES = 64;         // slices kept in the browser, least recently received dropped
+  const REQUEST_TIMEOUT = 5000;  // ms before an unanswered slice request is sent again
+
+  const viewport = document.getElementById("viewport");
+  const spacer = document.getElementById("spacer");
+  const status = document.getElementById("status");
+
+  // Relative thumbnail paths ("app/static/...") belong to the Streamlit page, not this iframe
+  const pageUrl = new URLSearchParams(window.location.search).get("streamlitUrl") || document.referrer;
+
+  let args = null;
+  let resultId = null;
+  let frameHeight = 0;
+  let slices = new Map();  // slice start -> rows
+  let pending = null;      // {start, sentAt} of the unanswered request
+  let requestCount = 0;
+  let cards = new Map();   // item index -> {element, loaded}
+  let scheduled = false;
+
+  function send(type, data) {
+    window.parent.postMessage(Object.assign({ isStreamlitMessage: true, type: type }, data), "*");
+  }
+
+  function resolveUrl(src) {
+    try {
+      return new URL(src, pageUrl).href;
+    } catch (error) {
+      return src;
+    }
+  }
+
+  function sliceStart(index) {
+    return Math.floor(index / args.slice_rows) * args.slice_rows;
+  }
+
+  function rowAt(index) {
+    const rows = slices.get(sliceStart(index));
+    return rows === undefined ? undefined : rows[index - sliceStart(index)];
+  }
+
+  function ratingStars(rating) {
+    const full = Math.floor(rating);
+    const half = rating - full >= 0.5 ? 1 : 0;
+    return "★".repeat(full) + (half ? "½" : "") + "☆".repeat(Math.max(0, 5 - full - half));
+  }
+
+  function element(tag, className, text) {
+    const node = document.createElement(tag);
+    if (className) node.className = className;
+    if (text !== undefined) node.textContent = text;
+    return node;
+  }
+
+  // Row layout: [link, image, title, brand, category, price, rating, qty, badge]
+  function fillCard(card, row) {
+    const [link, image, title, brand, category, price, rating, qty, badge] = row;
+    card.className = "product-card";
+    card.replaceChildren();
+
+    const badges = args.badges[String(badge)] || [];
+    if (badges.length) {
+      const box = element("div", "product-badges");
+      for (const [badgeClass, label] of badges) box.appendChild(element("div", "badge " + badgeClass, label));
+      card.appendChild(box);
+    }
+
+    const img = element("img", "product-image");
+    img.loading = "lazy";
+    img.decoding = "async";
+    img.alt = "";
+    img.src = resolveUrl(image);
+    card.appendChild(img);
+
+    card.appendChild(element("div", "product-category", category));
+    card.appendChild(element("div", "product-brand", brand));
+    card.appendChild(element("div", "product-title", title.length > 60 ? title.slice(0, 60) + "..." : title));
+    card.appendChild(element("div", "product-price", args.currency + price.toFixed(2)));
+
+    let qtyText = "Qty Sold: " + qty.toLocaleString("en-US");
+    if (qty === 0) qtyText = "New Product";
+    else if (qty < 10) qtyText += " 🔥";
+    card.appendChild(element("div", "product-qty", qtyText));
+
+    const ratingBox = element("div", "product-rating");
+    if (rating > 0) {
+      ratingBox.appendChild(element("span", "rating-stars", ratingStars(rating)));
+      ratingBox.appendChild(element("span", "rating-value", rating.toFixed(1)));
+    }
+    card.appendChild(ratingBox);
+
+    if (link) {
+      const anchor = element("a", "product-link", "View Product");
+      anchor.href = link;
+      anchor.target = "_blank";
+      anchor.rel = "noopener";
+      card.appendChild(anchor);
+    } else {
+      const button = element("button", "product-link", "No Link");
+      button.disabled = true;
+      card.appendChild(button);
+    }
+  }
+
+  function releaseCard(index) {
+    const card = cards.get(index);
+    // Dropping the src cancels an image that is still downloading
+    for (const img of card.element.querySelectorAll("img")) img.removeAttribute("src");
+    card.element.remove();
+    cards.delete(index);
+  }
+
+  function request(start) {
+    pending = { start: start, sentAt: Date.now() };
+    requestCount += 1;
+    send("streamlit:setComponentValue", {
+      value: { result_id: resultId, start: start, request: requestCount },
+      dataType: "json"
+    });
+  }
+
+  function update() {
+    scheduled = false;
+    if (args === null) return;
+
+    const width = viewport.clientWidth;
+    const columns = Math.max(1, Math.floor((width + GAP) / (MIN_CARD_WIDTH + GAP)));
+    const cardWidth = (width - GAP * (columns - 1)) / columns;
+    const rowHeight = CARD_HEIGHT + GAP;
+    const totalRows = Math.ceil(args.total / columns);
+    spacer.style.height = Math.max(0, totalRows * rowHeight - GAP) + "px";
+
+    const firstRow = Math.max(0, Math.floor(viewport.scrollTop / rowHeight) - OVERSCAN_ROWS);
+    const lastRow = Math.min(totalRows, Math.ceil((viewport.scrollTop + viewport.clientHeight) / rowHeight) + OVERSCAN_ROWS);
+    const first = firstRow * columns;
+    const last = Math.min(args.total, lastRow * columns);
+
+    for (const index of Array.from(cards.keys())) {
+      if (index < first || index >= last) releaseCard(index);
+    }
+
+    let missing = null;
+    for (let index = first; index < last; index++) {
+      const row = rowAt(index);
+      let card = cards.get(index);
+      if (card === undefined) {
+        card = { element: element("div", "product-card loading"), loaded: false };
+        viewport.appendChild(card.element);
+        cards.set(index, card);
+      }
+      const column = index % columns;
+      const top = Math.floor(index / columns) * rowHeight;
+      card.element.style.width = cardWidth + "px";
+      card.element.style.height = CARD_HEIGHT + "px";
+      card.element.style.transform = "translate(" + column * (cardWidth + GAP) + "px," + top + "px)";
+      if (row !== undefined && !card.loaded) {
+        fillCard(card.element, row);
+        card.loaded = true;
+      } else if (row === undefined && missing === null) {
+        missing = sliceStart(index);
+      }
+    }
+
+    // Ask for what is on screen first, otherwise read ahead once the next slice is half a slice away
+    const ahead = Math.min(args.total - 1, last + Math.floor(args.slice_rows / 2));
+    if (missing === null && last < args.total && !slices.has(sliceStart(ahead))) missing = sliceStart(ahead);
+    const stale = pending !== null && Date.now() - pending.sentAt > REQUEST_TIMEOUT;
+    if (missing !== null && (pending === null || stale)) request(missing);
+
+    status.textContent = args.total ? "" : "No products found with current filters.";
+  }
+
+  function scheduleUpdate() {
+    if (!scheduled) {
+      scheduled = true;
+      window.requestAnimationFrame(update);
+    }
+  }
+
+  function onRender(renderArgs) {
+    if (renderArgs.result_id !== resultId) {
+      // A different result set: forget every slice and start from the top
+      resultId = renderArgs.result_id;
+      slices = new Map();
+      pending = null;
+      for (const index of Array.from(cards.keys())) releaseCard(index);
+      viewport.scrollTop = 0;
+    }
+    args = renderArgs;
+
+    if (!slices.has(args.start)) {
+      slices.set(args.start, args.rows);
+      if (slices.size > MAX_SLICES) slices.delete(slices.keys().next().value);
+    }
+    if (pending !== null && pending.start === args.start) pending = null;
+
+    if (args.height !== frameHeight) {
+      frameHeight = args.height;
+      send("streamlit:setFrameHeight", { height: frameHeight });
+    }
+    scheduleUpdate();
+  }
+
+  window.addEventListener("message", function (event) {
+    if (event.data && event.data.type === "streamlit:render") onRender(event.data.args);
+  });
+  viewport.addEventListener("scroll", scheduleUpdate, { passive: true });
+  window.addEventListener("resize", function () {
+    // Column count may change, so every card is repositioned
+    for (const index of Array.from(cards.keys())) releaseCard(index);
+    scheduleUpdate();
+  });
+  // A request that never got its slice is retried on the next frame after it goes stale
+  window.setInterval(function () {
+    if (pending !== null && Date.now() - pending.sentAt > REQUEST_TIMEOUT) scheduleUpdate();
+  }, REQUEST_TIMEOUT);
+
+  send("streamlit:componentReady", { apiVersion: 1 });
+})();
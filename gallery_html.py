@@ -0,0 +1,151 @@
+"""Product card HTML and infinite-gallery rows, built without Streamlit so the benchmark can time them"""
+import base64
+import html
+
+from core import BADGES
+from image_cache import STATIC_DIR
+
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/300x400.png?text=Macy%27s+Product"
+
+
+def get_rating_stars(rating):
+    """Generate star rating HTML"""
+    full_stars = int(rating)
+    half_star = 1 if rating - full_stars >= 0.5 else 0
+    empty_stars = 5 - full_stars - half_star
+
+    stars_html = '★' * full_stars
+    if half_star:
+        stars_html += '½'
+    stars_html += '☆' * empty_stars
+
+    return stars_html
+
+
+def is_image_url(image_url):
+    return bool(image_url) and image_url != 'nan' and image_url.startswith(('http://', 'https://'))
+
+
+def page_image_urls(df, positions):
+    """Valid image URLs of the rows at the given positions"""
+    urls = (str(url).strip() for url in df['Image_URL'].to_numpy()[positions])
+    return [url for url in urls if is_image_url(url)]
+
+
+def thumbnail_src(image_cache, image_url, size='card'):
+    """Browser src for the cached thumbnail of image_url, or the original URL if not cached"""
+    path = image_cache.cached_path(image_url, size) if image_cache is not None else None
+    if path is None:
+        return image_url
+
+    # Files under ./static are served by Streamlit; anything else is inlined
+    try:
+        return f"app/static/{path.resolve().relative_to(STATIC_DIR).as_posix()}"
+    except ValueError:
+        encoded = base64.b64encode(path.read_bytes()).decode('ascii')
+        return f"data:{image_cache.mime_type};base64,{encoded}"
+
+
+def card_image_src(image_cache, image_url):
+    """Card image src: the cached thumbnail, the original URL or the placeholder"""
+    image_url = str(image_url).strip()
+    return thumbnail_src(image_cache, image_url) if is_image_url(image_url) else PLACEHOLDER_IMAGE
+
+
+def product_card_html(product_link, image_src, qty, title, brand, price, rating, category,
+                      badges, currency, show_brand=True):
+    """Build the HTML for a single product card"""
+    parts = ['<div class="product-card">']
+
+    # Badges
+    if badges:
+        parts.append('<div class="product-badges">')
+        for badge_class, badge_text in badges:
+            parts.append(f'<div class="badge {badge_class}">{badge_text}</div>')
+        parts.append('</div>')
+
+    # Image
+    parts.append(f'<img class="product-image" src="{html.escape(image_src)}" loading="lazy" alt="">')
+
+    # Category and brand
+    parts.append(f"<div class='product-category'>{html.escape(str(category))}</div>")
+    if show_brand:
+        parts.append(f"<div class='product-brand'>{html.escape(str(brand))}</div>")
+
+    # Title
+    title = str(title)
+    title = title[:60] + ('...' if len(title) > 60 else '')
+    parts.append(f"<div class='product-title'>{html.escape(title)}</div>")
+
+    # Price
+    parts.append(f"<div class='product-price'>{currency}{price:.2f}</div>")
+
+    # Quantity Sold - CHANGED LABEL
+    qty_text = f"Qty Sold: {qty:,}"
+    if qty == 0:
+        qty_text = "New Product"
+    elif qty < 10:
+        qty_text += " 🔥"
+    parts.append(f"<div class='product-qty'>{qty_text}</div>")
+
+    # Rating
+    if rating > 0:
+        parts.append(
+            f"<div class='product-rating'><span class='rating-stars'>{get_rating_stars(rating)}</span>"
+            f"<span class='rating-value'>{rating:.1f}</span></div>"
+        )
+
+    # Links
+    parts.append('<div class="product-links">')
+    product_link = str(product_link).strip()
+    if product_link and product_link != 'nan' and product_link.startswith('http'):
+        parts.append(f'<a href="{html.escape(product_link)}" target="_blank" class="product-link">View Product</a>')
+    else:
+        parts.append('<button class="product-link" disabled>No Link</button>')
+    parts.append('</div>')
+
+    parts.append('</div>')
+    # No newlines or indentation, so markdown never turns the block into code
+    return ''.join(parts)
+
+
+def product_cards_html(page_df, badges, currency, show_brand=True, image_cache=None):
+    """Build the HTML for all cards on a page from its column arrays
+
+    Images are served from image_cache's thumbnails where present; without
+    a cache every card links its original Image_URL.
+    """
+    columns = zip(
+        page_df['Product_Link'].to_numpy(), page_df['Image_URL'].to_numpy(),
+        page_df['Qty'].to_numpy(), page_df['Title'].to_numpy(), page_df['Brand'].to_numpy(),
+        page_df['Current'].to_numpy(), page_df['Avg Rating'].to_numpy(), page_df['Category'].to_numpy(),
+        badges.loc[page_df.index].to_numpy()
+    )
+
+    cards = []
+    for product_link, image_url, qty, title, brand, price, rating, category, badge in columns:
+        cards.append(product_card_html(
+            product_link, card_image_src(image_cache, image_url), qty, title, brand, price, rating, category,
+            BADGES[badge], currency, show_brand=show_brand
+        ))
+
+    return ''.join(cards)
+
+
+def gallery_rows(page_df, badges, image_cache=None):
+    """Compact JSON rows of a gallery slice for the infinite-scroll component"""
+    columns = zip(
+        page_df['Product_Link'].tolist(), page_df['Image_URL'].tolist(), page_df['Title'].tolist(),
+        page_df['Brand'].tolist(), page_df['Category'].tolist(), page_df['Current'].tolist(),
+        page_df['Avg Rating'].tolist(), page_df['Qty'].tolist(), badges.loc[page_df.index].tolist()
+    )
+
+    rows = []
+    for product_link, image_url, title, brand, category, price, rating, qty, badge in columns:
+        product_link = str(product_link).strip()
+        rows.append([
+            product_link if product_link.startswith('http') else '',
+            card_image_src(image_cache, image_url),
+            str(title), str(brand), str(category), round(price, 2), round(rating, 1), qty, badge
+        ])
+    return rows
@@ -0,0 +1,286 @@
+"""On-disk cache of resized product thumbnails downloaded from Image_URL"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+# ========== CONFIGURATION ==========
+# Thumbnails live under ./static so Streamlit can serve them as plain files
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+THUMBNAIL_DIR = Path(os.environ.get("THUMBNAIL_CACHE_DIR", STATIC_DIR / "thumbnails"))
+THUMBNAIL_MAX_BYTES = int(os.environ.get("THUMBNAIL_CACHE_MAX_BYTES", 512 * 1024 ** 2))
+# Failed URLs with their errors; kept out of ./static, which is served publicly
+FAILED_LOG = Path(os.environ.get("THUMBNAIL_FAILED_LOG", ".cache/thumbnail_failures.json"))
+
+# (width, height) bounding boxes; thumbnails keep their aspect ratio
+THUMBNAIL_SIZES = {
+    'card': (300, 400),
+    'list': (80, 80)
+}
+THUMBNAIL_FORMAT = os.environ.get("THUMBNAIL_FORMAT", "WEBP").upper()
+THUMBNAIL_QUALITY = 80
+
+FETCH_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+MAX_IMAGE_BYTES = 20 * 1024 ** 2
+FAILED_RETRY_SECONDS = 6 * 3600
+
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", 8))
+PREFETCH_PER_HOST = int(os.environ.get("PREFETCH_PER_HOST", 4))
+PREFETCH_MAX_PENDING = 512
+
+FORMAT_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+FORMAT_MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+
+def pooled_session(pool_size=PREFETCH_WORKERS):
+    """requests.Session that keeps enough keep-alive connections for the prefetch pool"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class ImageCache:
+    """Downloads each image once and keeps resized copies, evicted LRU by disk budget
+
+    URLs that fail to download or decode are remembered for
+    FAILED_RETRY_SECONDS so broken links are not fetched on every render.
+    Pass a requests.Session to point the cache at a local HTTP stand-in.
+    """
+
+    def __init__(self, root=THUMBNAIL_DIR, max_bytes=THUMBNAIL_MAX_BYTES, sizes=None,
+                 image_format=THUMBNAIL_FORMAT, session=None, timeout=FETCH_TIMEOUT, failed_log=FAILED_LOG):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.sizes = dict(sizes or THUMBNAIL_SIZES)
+        self.image_format = image_format
+        self.extension = FORMAT_EXTENSIONS[image_format]
+        self.mime_type = FORMAT_MIME_TYPES[image_format]
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._failed_path = Path(failed_log)
+        # Earlier versions wrote the log into the served thumbnail directory
+        (self.root / "failed.json").unlink(missing_ok=True)
+        self._failed = None
+        self._total_bytes = None
+
+    # ---------- lookups ----------
+    def path_for(self, url, size):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return self.root / key[:2] / f"{key}-{size}.{self.extension}"
+
+    def cached_path(self, url, size):
+        """Path of an already cached thumbnail, or None"""
+        path = self.path_for(url, size)
+        try:
+            # Touch the entry so eviction sees it as recently used
+            now = time.time()
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            return None
+        return path
+
+    def thumbnail(self, url, size='card'):
+        """Path of the thumbnail for url, downloading it on a miss; None if unavailable"""
+        path = self.cached_path(url, size)
+        if path is not None:
+            return path
+        if self.is_failed(url) or not self.fetch(url):
+            return None
+        return self.cached_path(url, size)
+
+    def get(self, url, size='card', fetch=True):
+        """Thumbnail bytes for url, downloading it on a miss unless fetch=False"""
+        path = self.thumbnail(url, size) if fetch else self.cached_path(url, size)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            # Evicted between lookup and read
+            return None
+
+    # ---------- downloading ----------
+    def fetch(self, url, session=None):
+        """Download url once and store every thumbnail size; False on failure"""
+        try:
+            data = self._download(url, session or self.session)
+            self.store(url, data)
+        except Exception as e:
+            self.mark_failed(url, e)
+            return False
+        return True
+
+    def _download(self, url, session):
+        with session.get(url, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            chunks = []
+            received = 0
+            for chunk in response.iter_content(64 * 1024):
+                received += len(chunk)
+                if received > MAX_IMAGE_BYTES:
+                    raise ValueError(f"image larger than {MAX_IMAGE_BYTES} bytes")
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+    def store(self, url, data):
+        """Decode raw image bytes and write one resized file per configured size"""
+        largest = max(self.sizes.values())
+        written = 0
+        with Image.open(io.BytesIO(data)) as image:
+            # Let the JPEG decoder downscale while decoding when it can
+            image.draft('RGB', (largest[0] * 2, largest[1] * 2))
+            image.load()
+            for size, box in self.sizes.items():
+                written += self._write_thumbnail(image, self.path_for(url, size), box)
+        self._add_bytes(written)
+
+    def _write_thumbnail(self, image, path, box):
+        thumb = image.copy()
+        thumb.thumbnail(box, Image.Resampling.LANCZOS)
+        if self.image_format == 'JPEG':
+            if thumb.mode != 'RGB':
+                thumb = self._flatten(thumb)
+        elif thumb.mode not in ('RGB', 'RGBA'):
+            thumb = thumb.convert('RGBA')
+
+        buffer = io.BytesIO()
+        thumb.save(buffer, format=self.image_format, quality=THUMBNAIL_QUALITY)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(buffer.getvalue())
+        os.replace(tmp_path, path)
+        return buffer.tell()
+
+    @staticmethod
+    def _flatten(image):
+        # JPEG has no alpha channel, so composite onto white
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+
+    # ---------- failed URLs ----------
+    def _load_failed(self):
+        if self._failed is None:
+            try:
+                self._failed = json.loads(self._failed_path.read_text())
+            except (FileNotFoundError, ValueError):
+                self._failed = {}
+        return self._failed
+
+    def is_failed(self, url):
+        """True if url failed recently and should not be retried yet"""
+        with self._lock:
+            failure = self._load_failed().get(url)
+        return failure is not None and time.time() - failure['at'] < FAILED_RETRY_SECONDS
+
+    def mark_failed(self, url, error):
+        with self._lock:
+            failed = self._load_failed()
+            failed[url] = {'at': time.time(), 'error': str(error)[:200]}
+            self._save_failed(failed)
+
+    def failed_urls(self):
+        with self._lock:
+            return dict(self._load_failed())
+
+    def _save_failed(self, failed):
+        # Forget failures old enough to be retried so the file stays small
+        cutoff = time.time() - FAILED_RETRY_SECONDS
+        for url in [url for url, failure in failed.items() if failure['at'] < cutoff]:
+            del failed[url]
+        self._failed_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._failed_path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(failed))
+        os.replace(tmp_path, self._failed_path)
+
+    # ---------- eviction ----------
+    def _entries(self):
+        entries = []
+        for entry in self.root.glob(f"*/*.{self.extension}"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        return entries
+
+    def _add_bytes(self, written):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += written
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Remove least-recently-used thumbnails until the cache is under 90% of budget"""
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * 0.9
+            for _, size, entry in sorted(entries, key=lambda e: e[0]):
+                if total <= target:
+                    break
+                entry.unlink(missing_ok=True)
+                total -= size
+            self._total_bytes = total
+
+
+class ImagePrefetcher:
+    """Warms an ImageCache from a bounded thread pool with per-host concurrency limits"""
+
+    def __init__(self, image_cache, max_workers=PREFETCH_WORKERS, per_host=PREFETCH_PER_HOST,
+                 max_pending=PREFETCH_MAX_PENDING):
+        self.image_cache = image_cache
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-prefetch")
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, urls, size='card'):
+        """Queue downloads for uncached urls and return their futures without waiting"""
+        futures = []
+        for url in dict.fromkeys(urls):
+            if self.image_cache.cached_path(url, size) is not None or self.image_cache.is_failed(url):
+                continue
+            with self._lock:
+                future = self._pending.get(url)
+                if future is None:
+                    # Drop work beyond the queue bound; it is picked up again on a later page view
+                    if len(self._pending) >= self.max_pending:
+                        continue
+                    future = self._executor.submit(self._fetch, url)
+                    self._pending[url] = future
+                    future.add_done_callback(lambda _, url=url: self._done(url))
+            futures.append(future)
+        return futures
+
+    def _fetch(self, url):
+        # Looked up under the lock, so two workers reaching a new host share one semaphore
+        with self._lock:
+            slots = self._host_slots[urlsplit(url).netloc]
+        with slots:
+            return self.image_cache.fetch(url)
+
+    def _done(self, url):
+        with self._lock:
+            self._pending.pop(url, None)
@@ -0,0 +1,39 @@
+"""Virtualized infinite-scroll product gallery: a local static component fed JSON row slices"""
+from pathlib import Path
+
+import streamlit.components.v1 as components
+
+# ========== CONFIGURATION ==========
+COMPONENT_DIR = Path(__file__).resolve().parent / "frontend" / "infinite_gallery"
+SLICE_ROWS = 96  # rows serialized per request, a few screens of cards
+FRAME_HEIGHT = 900  # px; the gallery scrolls inside its frame
+
+_component = components.declare_component("infinite_gallery", path=str(COMPONENT_DIR))
+
+
+def requested_slice(value, result_id, total, slice_rows=SLICE_ROWS):
+    """[start, stop) of the slice the browser last asked for, or the first slice
+
+    Requests made for an earlier result set (before a filter or sort
+    change) are ignored. Starts are aligned to slice_rows, matching the
+    browser's slice cache.
+    """
+    start = 0
+    if isinstance(value, dict) and value.get('result_id') == result_id:
+        start = int(value.get('start') or 0)
+    start = max(0, min(start, total - 1)) // slice_rows * slice_rows
+    return start, min(start + slice_rows, total)
+
+
+def infinite_gallery(result_id, total, start, rows, currency, badges, height=FRAME_HEIGHT, key=None):
+    """Render the gallery with one slice of rows; the next request comes back as the component value
+
+    rows are [link, image src, title, brand, category, price, rating, qty,
+    badge code] lists, badges maps each badge code to its (css class, label)
+    pairs.
+    """
+    return _component(
+        result_id=result_id, total=total, start=start, rows=rows, slice_rows=SLICE_ROWS,
+        currency=currency, badges={str(code): pairs for code, pairs in badges.items()}, height=height,
+        key=key, default=None
+    )
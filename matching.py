@@ -0,0 +1,228 @@
+"""Comparable products across brands: hashed character n-gram TF-IDF, blocked by category and price band"""
+import numpy as np
+import pandas as pd
+
+# ========== CONFIGURATION ==========
+MATCH_NGRAM = 3
+MATCH_DIMENSIONS = 2 ** 11  # hashed n-gram buckets
+MATCH_MAX_TITLE_BYTES = 120
+PRICE_BAND_BASE = 2.0  # a band spans prices within a factor of this
+MIN_SIMILARITY = 0.3
+MATCH_BATCH_ROWS = 1024
+MATCH_EXACT_PAIRS = 4096  # blocks with more distinct (brand, title) pairs are clustered first
+MATCH_SKETCH_DIMENSIONS = 256  # random projection width of the vectors clustering runs on
+MATCH_CLUSTER_PAIRS = 256  # average pairs per cluster
+MATCH_PROBES = 4  # closest clusters each pair is compared with
+MATCH_KMEANS_ITERATIONS = 5
+
+
+def _ranges(starts, lengths):
+    """Concatenated np.arange(start, start + length) for every range, without a Python loop"""
+    return np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+
+
+def hashed_ngram_counts(titles, dimensions=MATCH_DIMENSIONS, n=MATCH_NGRAM):
+    """(document, bucket, count) triples of the hashed character n-grams of each title
+
+    Titles are padded with a space on each side, so word starts and ends
+    become n-grams of their own. Hashing is vectorized over a fixed-width
+    byte matrix instead of looping over titles.
+    """
+    encoded = [f" {title.lower()} ".encode('utf-8', 'replace')[:MATCH_MAX_TITLE_BYTES] for title in titles]
+    lengths = np.fromiter((len(title) for title in encoded), dtype=np.int64, count=len(encoded))
+    width = max(int(lengths.max(initial=0)), n)
+    chars = np.array(encoded, dtype=f'S{width}').view(np.uint8).reshape(len(encoded), width).astype(np.uint32)
+
+    codes = np.zeros((len(encoded), width - n + 1), dtype=np.uint32)
+    for offset in range(n):
+        codes = (codes << np.uint32(8)) | chars[:, offset:width - n + 1 + offset]
+    # Multiplicative hashing; the top bits are the best mixed
+    buckets = (codes * np.uint32(2654435761)) >> np.uint32(32 - int(np.log2(dimensions)))
+
+    valid = np.arange(width - n + 1)[None, :] <= (lengths - n)[:, None]
+    documents = np.broadcast_to(np.arange(len(encoded))[:, None], codes.shape)[valid]
+    keys, counts = np.unique(documents.astype(np.int64) * dimensions + buckets[valid], return_counts=True)
+    return keys // dimensions, keys % dimensions, counts
+
+
+class ComparableMatcher:
+    """Closest same-category, similar-price product of every other brand, for every product
+
+    Titles are vectorized once per dataset as L2-normalized TF-IDF over
+    hashed character trigrams. Matching only compares products inside a
+    (category, price band) block, with dense NumPy matrix products over
+    each block's distinct (title, brand) pairs in row batches. Blocks larger
+    than MATCH_EXACT_PAIRS are clustered on random projections of the
+    vectors first and only compared cluster by cluster, so their cost grows
+    with block size times MATCH_PROBES * MATCH_CLUSTER_PAIRS instead of
+    block size squared; a product can then miss a best match that landed in
+    a cluster it did not probe.
+    """
+
+    def __init__(self, df, dimensions=MATCH_DIMENSIONS):
+        self.df = df
+        self.dimensions = dimensions
+
+        self._row_titles, titles = pd.factorize(df['Title'].astype(str))
+        documents, buckets, counts = hashed_ngram_counts(titles, dimensions)
+
+        document_frequency = np.bincount(buckets, minlength=dimensions)
+        idf = np.log((1 + len(titles)) / (1 + document_frequency)) + 1
+        weights = ((1 + np.log(counts)) * idf[buckets]).astype(np.float32)
+        norms = np.sqrt(np.bincount(documents, weights=weights.astype(np.float64) ** 2, minlength=len(titles)))
+        self._weights = weights / norms[documents].astype(np.float32)
+        self._buckets = buckets.astype(np.int32)
+        self._offsets = np.searchsorted(documents, np.arange(len(titles) + 1))
+
+        price = df['Current'].to_numpy(dtype=np.float64)
+        bands = np.floor(np.log(np.maximum(price, 1.0)) / np.log(PRICE_BAND_BASE)).astype(np.int64)
+        category_codes = pd.factorize(df['Category'])[0]
+        self._blocks = category_codes * (int(bands.max(initial=0)) + 1) + bands
+
+        # Gaussian random projection: sketch dot products estimate the cosine similarities
+        rng = np.random.default_rng(0)
+        self._projection = (rng.standard_normal((dimensions, MATCH_SKETCH_DIMENSIONS))
+                            / np.sqrt(MATCH_SKETCH_DIMENSIONS)).astype(np.float32)
+
+    def _vectors(self, title_ids):
+        """Dense normalized vectors for a set of titles"""
+        starts, ends = self._offsets[title_ids], self._offsets[title_ids + 1]
+        lengths = ends - starts
+        flat = _ranges(starts, lengths)
+        vectors = np.zeros((len(title_ids), self.dimensions), dtype=np.float32)
+        vectors[np.repeat(np.arange(len(title_ids)), lengths), self._buckets[flat]] = self._weights[flat]
+        return vectors
+
+    def _sketches(self, title_ids):
+        """Unit-length random projections of the titles' vectors"""
+        sketches = np.concatenate([
+            self._vectors(title_ids[start:start + MATCH_BATCH_ROWS]) @ self._projection
+            for start in range(0, len(title_ids), MATCH_BATCH_ROWS)
+        ])
+        return sketches / np.maximum(np.linalg.norm(sketches, axis=1, keepdims=True), 1e-12)
+
+    def _comparisons(self, title_ids):
+        """(query pairs, candidate pairs) batches covering the comparisons of one block
+
+        Blocks up to MATCH_EXACT_PAIRS compare every pair with every pair.
+        Larger ones are clustered with spherical k-means on the sketches, and
+        each pair is compared only with the members of its MATCH_PROBES
+        closest clusters. Candidate pairs are always in ascending order.
+        """
+        if len(title_ids) <= MATCH_EXACT_PAIRS:
+            everything = np.arange(len(title_ids))
+            for start in range(0, len(title_ids), MATCH_BATCH_ROWS):
+                yield everything[start:start + MATCH_BATCH_ROWS], everything
+            return
+
+        sketches = self._sketches(title_ids)
+        n_clusters = -(-len(title_ids) // MATCH_CLUSTER_PAIRS)
+        rng = np.random.default_rng(0)
+        centroids = sketches[rng.choice(len(title_ids), n_clusters, replace=False)]
+        for _ in range(MATCH_KMEANS_ITERATIONS):
+            assignment = (sketches @ centroids.T).argmax(axis=1)
+            order = np.argsort(assignment, kind='stable')
+            bounds = np.searchsorted(assignment[order], np.arange(n_clusters + 1))
+            nonempty = np.flatnonzero(np.diff(bounds))
+            sums = np.add.reduceat(sketches[order], bounds[nonempty], axis=0)
+            centroids[nonempty] = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        similarity = sketches @ centroids.T
+        assignment = similarity.argmax(axis=1)
+        probes = min(MATCH_PROBES, n_clusters)
+        probed = np.argpartition(-similarity, probes - 1, axis=1)[:, :probes]
+        # Queries grouped by probed cluster, members grouped by assigned cluster
+        query_order = np.argsort(probed.ravel(), kind='stable')
+        query_bounds = np.searchsorted(probed.ravel()[query_order], np.arange(n_clusters + 1))
+        member_order = np.argsort(assignment, kind='stable')
+        member_bounds = np.searchsorted(assignment[member_order], np.arange(n_clusters + 1))
+        for cluster in range(n_clusters):
+            members = member_order[member_bounds[cluster]:member_bounds[cluster + 1]]
+            queries = query_order[query_bounds[cluster]:query_bounds[cluster + 1]] // probes
+            for start in range(0, len(queries) if len(members) else 0, MATCH_BATCH_ROWS):
+                yield queries[start:start + MATCH_BATCH_ROWS], members
+
+    def match(self, brands, min_similarity=MIN_SIMILARITY):
+        """Best counterpart in each other brand, as positions into df with their cosine similarity"""
+        brand_index = pd.Index(list(dict.fromkeys(brands)))
+        row_brands = brand_index.get_indexer(self.df['Brand'])
+        rows = np.flatnonzero(row_brands >= 0)
+
+        results = []
+        block_order = np.argsort(self._blocks[rows], kind='stable')
+        rows = rows[block_order]
+        bounds = np.flatnonzero(np.diff(self._blocks[rows])) + 1
+        for block_rows in np.split(rows, bounds):
+            results.extend(self._match_block(block_rows, row_brands, len(brand_index), min_similarity))
+
+        columns = ['position', 'match_position', 'similarity']
+        if not results:
+            return pd.DataFrame({'position': np.empty(0, dtype=np.int64), 'match_position': np.empty(0, dtype=np.int64),
+                                 'similarity': np.empty(0)})
+        matches = pd.DataFrame(np.concatenate(results), columns=columns)
+        matches[['position', 'match_position']] = matches[['position', 'match_position']].astype(np.int64)
+        return matches
+
+    def _match_block(self, block_rows, row_brands, n_brands, min_similarity):
+        # One vector per distinct (brand, title) pair; duplicate rows share its matches
+        pair_keys = row_brands[block_rows].astype(np.int64) * len(self._row_titles) + self._row_titles[block_rows]
+        pairs, first_rows, row_pairs = np.unique(pair_keys, return_index=True, return_inverse=True)
+        pair_brands = pairs // len(self._row_titles)
+        if len(np.unique(pair_brands)) < 2:
+            return []
+
+        # Pairs are sorted by brand, so each brand is one contiguous run of any sorted column subset
+        title_ids = pairs % len(self._row_titles)
+        representatives = block_rows[first_rows]
+
+        best_pair = np.full((len(pairs), n_brands), -1, dtype=np.int64)
+        best_score = np.full((len(pairs), n_brands), -1, dtype=np.float32)
+        for queries, columns in self._comparisons(title_ids):
+            scores = self._vectors(title_ids[queries]) @ self._vectors(title_ids[columns]).T
+            brand_bounds = np.searchsorted(pair_brands[columns], np.arange(n_brands + 1))
+            rows = np.arange(len(queries))
+            for brand in range(n_brands):
+                low, high = brand_bounds[brand], brand_bounds[brand + 1]
+                if low == high:
+                    continue
+                arg = low + scores[:, low:high].argmax(axis=1)
+                better = scores[rows, arg] > best_score[queries, brand]
+                best_pair[queries[better], brand] = columns[arg[better]]
+                best_score[queries[better], brand] = scores[rows[better], arg[better]]
+
+        # Never match a product with its own brand
+        best_pair[np.arange(len(pairs)), pair_brands] = -1
+        pair_index, brand = np.nonzero((best_pair >= 0) & (best_score >= min_similarity))
+        if not len(pair_index):
+            return []
+
+        # Expand pair-level matches to every row of the pair
+        order = np.argsort(row_pairs, kind='stable')
+        row_bounds = np.searchsorted(row_pairs[order], np.arange(len(pairs) + 1))
+        counts = row_bounds[pair_index + 1] - row_bounds[pair_index]
+        flat = _ranges(row_bounds[pair_index], counts)
+        matched_pairs = best_pair[pair_index, brand]
+        return [np.column_stack([
+            block_rows[order[flat]],
+            np.repeat(representatives[matched_pairs], counts),
+            np.repeat(best_score[pair_index, brand], counts)
+        ])]
+
+
+def head_to_head(df, matches):
+    """Matched product pairs with their price gap, one row per product and rival brand"""
+    left = df.iloc[matches['position'].to_numpy()]
+    right = df.iloc[matches['match_position'].to_numpy()]
+    price = left['Current'].to_numpy(dtype=np.float64)
+    rival_price = right['Current'].to_numpy(dtype=np.float64)
+    return pd.DataFrame({
+        'Brand': left['Brand'].astype(str).to_numpy(),
+        'Product': left['Title'].to_numpy(),
+        'Price': price.round(2),
+        'Rival Brand': right['Brand'].astype(str).to_numpy(),
+        'Rival Product': right['Title'].to_numpy(),
+        'Rival Price': rival_price.round(2),
+        'Gap': (price - rival_price).round(2),
+        'Gap %': np.where(rival_price > 0, (price / np.where(rival_price > 0, rival_price, 1) - 1) * 100, np.nan).round(1),
+        'Similarity': matches['similarity'].to_numpy().round(3)
+    }, index=left.index)
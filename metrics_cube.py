@@ -0,0 +1,189 @@
+"""Brand x Category x price bucket x rating bucket aggregates, rolled up for metrics and facets"""
+import numpy as np
+import pandas as pd
+
+# ========== CONFIGURATION ==========
+PRICE_BUCKETS = 64  # price quantiles, so buckets hold similar row counts
+RATING_BUCKETS_PER_STAR = 2  # matches the 0.5-star rating slider, so rating cuts never split a cell
+
+
+def _segment_running(values, segments, minimum):
+    """Running min (or max) of values that restarts at every segment, in one accumulate
+
+    Each segment is shifted below (or above) all earlier ones, so the
+    accumulate never carries a value across a segment boundary.
+    """
+    values = values.astype(np.float64)
+    span = float(values.max() - values.min()) + 1 if len(values) else 1.0
+    shift = segments * span
+    if minimum:
+        return np.minimum.accumulate(values - shift) + shift
+    return np.maximum.accumulate(values + shift) - shift
+
+
+class MetricsCube:
+    """Per-cell counts, sums and min/max of price, qty and rating, built once per dataset
+
+    A filter state is answered from the cells it selects. Rows are stored
+    grouped by cell and by descending Qty inside each cell, with running
+    sums, so the rows of a cell passing a minimum Qty are a prefix whose
+    aggregates are differences of the running sums. Only the cells
+    straddling a price (or off-bucket rating) bound have their rows
+    re-aggregated.
+    """
+
+    def __init__(self, df, price_buckets=PRICE_BUCKETS):
+        brand_codes, brands = pd.factorize(df['Brand'], sort=True)
+        category_codes, categories = pd.factorize(df['Category'], sort=True)
+        self.brands = pd.Index(np.asarray(brands, dtype=object))
+        self.categories = pd.Index(np.asarray(categories, dtype=object))
+
+        self._price = df['Current'].to_numpy()
+        self._qty = df['Qty'].to_numpy()
+        self._rating = df['Avg Rating'].to_numpy()
+
+        quantiles = np.linspace(0, 1, price_buckets + 1)[1:-1]
+        edges = np.unique(np.quantile(self._price, quantiles)) if len(df) else np.empty(0)
+        price_bucket = np.searchsorted(edges, self._price, side='right')
+        rating_bucket = np.floor(np.maximum(self._rating, 0) * RATING_BUCKETS_PER_STAR).astype(np.int64)
+
+        # Cell id -> (brand, category, price bucket, rating bucket)
+        n_price, n_rating = len(edges) + 1, int(rating_bucket.max(initial=0)) + 1
+        keys = ((brand_codes.astype(np.int64) * len(categories) + category_codes) * n_price + price_bucket) * n_rating \
+            + rating_bucket
+        cells, row_cells = np.unique(keys, return_inverse=True)
+        self.cell_brand = cells // (n_rating * n_price * len(categories))
+        self.cell_category = cells // (n_rating * n_price) % len(categories)
+
+        # Rows grouped by cell, highest Qty first within a cell
+        self._order = np.lexsort((-self._qty.astype(np.int64), row_cells))
+        sorted_cells = row_cells[self._order]
+        self._offsets = np.searchsorted(sorted_cells, np.arange(len(cells) + 1))
+        self.count = np.diff(self._offsets)
+
+        price, qty, rating = self._price[self._order], self._qty[self._order], self._rating[self._order]
+        self._qty_min = int(qty.min(initial=0))
+        self._qty_span = int(qty.max(initial=0)) - self._qty_min + 1
+        # Ascending search keys: cell, then Qty descending
+        self._qty_keys = sorted_cells * self._qty_span + (self._qty_span - 1 - (qty.astype(np.int64) - self._qty_min))
+
+        def running_sum(values):
+            return np.concatenate([[0], np.cumsum(values)])
+
+        self._price_sum = running_sum(price.astype(np.float64))
+        self._qty_sum = running_sum(qty.astype(np.int64))
+        self._rating_sum = running_sum(rating.astype(np.float64))
+        self._rated = running_sum(rating > 0)
+        self._price_low = _segment_running(price, sorted_cells, minimum=True)
+        self._price_high = _segment_running(price, sorted_cells, minimum=False)
+
+        # Cell bounds keep the column dtypes, so comparisons against filter values match FilterEngine's
+        starts = self._offsets[:-1]
+        self.price_min, self.price_max = self._bounds(price, starts)
+        self.rating_min, self.rating_max = self._bounds(rating, starts)
+        self.qty_max = qty[starts] if len(cells) else qty[:0]
+
+    @staticmethod
+    def _bounds(values, starts):
+        if not len(starts):
+            return values[:0], values[:0]
+        return np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+    def _selected(self, categories, brands=None):
+        """Cells of the given categories (all when empty) and brands (all when None)"""
+        selected = np.ones(len(self.count), dtype=bool)
+        if categories:
+            selected &= np.isin(self.cell_category, self.categories.get_indexer(list(categories)))
+        if brands is not None:
+            selected &= np.isin(self.cell_brand, self.brands.get_indexer(list(brands)))
+        return selected
+
+    def facets(self, categories=()):
+        """FilterEngine.category_facets() from the cells"""
+        cells = np.flatnonzero(self._selected(categories))
+        brand_counts = np.bincount(self.cell_brand[cells], weights=self.count[cells], minlength=len(self.brands))
+        present = np.flatnonzero(brand_counts)
+        return {
+            'brands': self.brands[present].tolist(),
+            'brand_counts': dict(zip(self.brands[present].tolist(), brand_counts[present].astype(int).tolist())),
+            'min_price': float(self.price_min[cells].min()) if len(cells) else 0.0,
+            'max_price': float(self.price_max[cells].max()) if len(cells) else 0.0,
+            'max_qty': int(self.qty_max[cells].max()) if len(cells) else 0
+        }
+
+    def _qty_prefix_stops(self, cells, min_qty):
+        """End of each cell's run of rows with Qty >= min_qty"""
+        threshold = np.clip(self._qty_span - 1 - (min_qty - self._qty_min), -1, self._qty_span - 1)
+        return np.searchsorted(self._qty_keys, cells * self._qty_span + threshold, side='right')
+
+    def rollup(self, categories, brands, price_range, min_rating, min_qty):
+        """calculate_metrics() and the filter's average price and row count, without a row scan"""
+        low, high = price_range
+        selected = self._selected(categories, brands)
+        inside = (self.price_min >= low) & (self.price_max <= high) & (self.rating_min >= min_rating)
+        outside = (self.price_max < low) | (self.price_min > high) | (self.rating_max < min_rating) \
+            | (self.qty_max < min_qty)
+
+        # Cells inside the price and rating bounds: the qualifying rows are a prefix
+        cells = np.flatnonzero(selected & inside & ~outside)
+        starts, stops = self._offsets[cells], self._qty_prefix_stops(cells, min_qty)
+        nonempty = stops > starts
+        cells, starts, stops = cells[nonempty], starts[nonempty], stops[nonempty]
+        cell_brands = self.cell_brand[cells]
+
+        # Cells straddling a bound: gather their rows as one flat index of the ranges
+        partial = np.flatnonzero(selected & ~inside & ~outside)
+        range_starts, lengths = self._offsets[partial], self.count[partial]
+        flat = np.arange(lengths.sum()) + np.repeat(range_starts - np.cumsum(lengths) + lengths, lengths)
+        rows = self._order[flat]
+        row_brands = np.repeat(self.cell_brand[partial], lengths)
+        price, qty, rating = self._price[rows], self._qty[rows], self._rating[rows]
+        keep = (price >= low) & (price <= high) & (rating >= min_rating) & (qty >= min_qty)
+        price, qty, rating, row_brands = price[keep], qty[keep], rating[keep], row_brands[keep]
+
+        n_brands = len(self.brands)
+
+        def total(running, row_values):
+            return (np.bincount(cell_brands, weights=running[stops] - running[starts], minlength=n_brands)
+                    + np.bincount(row_brands, weights=row_values, minlength=n_brands))
+
+        count = total(np.arange(len(self._price_sum)), np.ones(len(price)))
+        price_sum = total(self._price_sum, price.astype(np.float64))
+        qty_sum = total(self._qty_sum, qty.astype(np.float64))
+        rating_sum = total(self._rating_sum, rating.astype(np.float64))
+        rated = total(self._rated, (rating > 0).astype(np.float64))
+
+        price_min = np.full(n_brands, np.inf)
+        price_max = np.full(n_brands, -np.inf)
+        np.minimum.at(price_min, cell_brands, self._price_low[stops - 1])
+        np.maximum.at(price_max, cell_brands, self._price_high[stops - 1])
+        np.minimum.at(price_min, row_brands, price)
+        np.maximum.at(price_max, row_brands, price)
+
+        empty_metrics = {
+            'avg_price': 0, 'min_price': 0, 'max_price': 0, 'total_products': 0,
+            'total_qty': 0, 'avg_qty_per_product': 0, 'avg_rating': 0, 'rating_count': 0
+        }
+        metrics = {}
+        for brand, code in zip(brands, self.brands.get_indexer(list(brands))):
+            if code < 0 or count[code] == 0:
+                metrics[brand] = dict(empty_metrics)
+                continue
+            total_products = int(count[code])
+            metrics[brand] = {
+                'avg_price': round(price_sum[code] / total_products, 2),
+                'min_price': round(float(price_min[code]), 2),
+                'max_price': round(float(price_max[code]), 2),
+                'total_products': total_products,
+                'total_qty': int(qty_sum[code]),
+                'avg_qty_per_product': round(qty_sum[code] / total_products, 1),
+                'avg_rating': round(rating_sum[code] / total_products, 1),
+                'rating_count': int(rated[code])
+            }
+
+        total_products = int(count.sum())
+        summary = {
+            'avg_price': price_sum.sum() / total_products if total_products else np.nan,
+            'total_products': total_products
+        }
+        return metrics, summary
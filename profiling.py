@@ -0,0 +1,144 @@
+"""Opt-in per-run stage timings and peak allocations, appended to a JSON lines log"""
+import json
+import os
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+# ========== CONFIGURATION ==========
+PROFILE_ENABLED = os.environ.get("DASHBOARD_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_LOG = Path(os.environ.get("DASHBOARD_PROFILE_LOG", ".cache/profile.jsonl"))
+# The log is rotated to <name>.1 past this size, so at most twice it is kept on disk
+PROFILE_LOG_MAX_BYTES = int(os.environ.get("DASHBOARD_PROFILE_LOG_MAX_BYTES", 16 * 1024 ** 2))
+TAIL_BLOCK_BYTES = 64 * 1024
+# Frames kept per allocation; 1 is the cheapest setting that still measures peaks
+TRACEMALLOC_FRAMES = 1
+
+
+class StageProfiler:
+    """Wall time, and optionally tracemalloc peaks, for each named stage of one script run
+
+    Stages run back to back down the script: begin() closes the previous
+    stage. Disabled profilers make every call a no-op, so instrumented code
+    costs nothing unless profiling was switched on.
+
+    tracemalloc is process-wide: it slows every session down and its peak
+    is shared by all of them. So memory is only traced when profiling is
+    switched on for the whole server (DASHBOARD_PROFILE), and its peaks
+    include whatever other sessions allocated at the same time.
+    """
+
+    def __init__(self, enabled=PROFILE_ENABLED, log_path=PROFILE_LOG, trace_memory=PROFILE_ENABLED,
+                 max_bytes=PROFILE_LOG_MAX_BYTES):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.log_path = Path(log_path)
+        self.max_bytes = max_bytes
+        self.stages = []
+        self.context = {}
+        self._current = None
+        self._started = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def begin(self, name):
+        """Close the running stage, if any, and start timing the next one"""
+        if not self.enabled:
+            return
+        self.end()
+        current_before = None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            current_before = tracemalloc.get_traced_memory()[0]
+        self._current = (name, time.perf_counter(), current_before)
+
+    def end(self):
+        if not self.enabled or self._current is None:
+            return
+        name, started, current_before = self._current
+        stage = {'stage': name, 'ms': (time.perf_counter() - started) * 1000}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stage['peak_mb'] = (peak - current_before) / 1024 ** 2
+            stage['retained_mb'] = (current - current_before) / 1024 ** 2
+        self.stages.append(stage)
+        self._current = None
+
+    def annotate(self, **context):
+        """Attach run context (dataset hash, filter state...) to the log record"""
+        self.context.update(context)
+
+    def record(self):
+        self.end()
+        return {
+            'timestamp': time.time(),
+            'total_ms': (time.perf_counter() - self._started) * 1000,
+            **self.context,
+            'stages': self.stages
+        }
+
+    def write(self, session_id=None):
+        """Append this run as one JSON line, rotating a full log first"""
+        if not self.enabled:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.log_path.stat().st_size >= self.max_bytes:
+                os.replace(self.log_path, rotated_path(self.log_path))
+        except FileNotFoundError:
+            pass
+        with open(self.log_path, 'a', encoding='utf-8') as log:
+            log.write(json.dumps({'session_id': session_id, **self.record()}, default=str) + '\n')
+
+
+def rotated_path(log_path):
+    return log_path.with_name(log_path.name + '.1')
+
+
+def tail_lines(path, count):
+    """Last count lines of a file, read backwards block by block instead of whole"""
+    try:
+        with open(path, 'rb') as file:
+            position = file.seek(0, os.SEEK_END)
+            data = b''
+            # One extra newline: the first line of the tail may be cut mid-way
+            while position > 0 and data.count(b'\n') <= count:
+                size = min(TAIL_BLOCK_BYTES, position)
+                position -= size
+                file.seek(position)
+                data = file.read(size) + data
+    except FileNotFoundError:
+        return []
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    if position > 0:
+        lines = lines[1:]
+    return lines[-count:] if count else []
+
+
+def stage_percentiles(log_path=PROFILE_LOG, last=1000):
+    """p50/p95/max milliseconds per stage over the last runs in the log"""
+    log_path = Path(log_path)
+    lines = tail_lines(log_path, last)
+    if len(lines) < last:
+        # Right after a rotation the recent runs are split across both files
+        lines = tail_lines(rotated_path(log_path), last - len(lines)) + lines
+
+    rows = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        rows.extend({'Stage': stage['stage'], 'ms': stage['ms']} for stage in record.get('stages', []))
+    if not rows:
+        return None
+
+    stats = pd.DataFrame(rows).groupby('Stage', sort=False)['ms']
+    return pd.DataFrame({
+        'Runs': stats.size(),
+        'p50 ms': stats.median(),
+        'p95 ms': stats.quantile(0.95),
+        'Max ms': stats.max()
+    }).round(1).reset_index()
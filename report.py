@@ -0,0 +1,130 @@
+"""Headless brand-metrics report over many category x brand-set filter combinations
+
+    python report.py macys_data.xlsx --brand-set "Nike,Adidas" --output metrics.parquet
+
+The data file is parsed once, into the Parquet dataset cache, and every worker
+process reads that normalized copy in its initializer instead of re-parsing the
+original file. Each combination is then a handful of cached boolean masks.
+"""
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from core import FilterEngine, MissingColumnsError, calculate_metrics, load_dataset
+from dataset_cache import DatasetCache
+
+ALL_CATEGORIES = 'All'
+
+# Per-process state, set up once by init_worker
+_engine = None
+
+
+def init_worker(parquet_path, dataset_hash):
+    global _engine
+    df = pd.read_parquet(parquet_path, engine="pyarrow")
+    df.attrs['dataset_hash'] = dataset_hash
+    _engine = FilterEngine(df)
+
+
+def combination_metrics(combination):
+    """Metric rows, one per brand, for one (category, brand set, min rating, min qty)"""
+    category, brand_set, min_rating, min_qty = combination
+    _engine.filter_categories([] if category == ALL_CATEGORIES else [category])
+    _engine.filter_brands(list(brand_set))
+    _engine.filter_min_rating(min_rating)
+    _engine.filter_min_qty(min_qty)
+    filtered_df = _engine.apply()
+
+    metrics = calculate_metrics(filtered_df, list(brand_set))
+    return [
+        {'Category': category, 'Brand Set': ', '.join(brand_set), 'Brand': brand, **brand_metrics}
+        for brand, brand_metrics in metrics.items()
+    ]
+
+
+def build_combinations(df, brand_sets, categories, min_rating, min_qty):
+    """Every category (plus All) crossed with every brand set, grouped by category"""
+    if not categories:
+        categories = [ALL_CATEGORIES] + sorted(df['Category'].unique().tolist())
+    if not brand_sets:
+        brand_sets = [tuple(sorted(df['Brand'].unique().tolist()))]
+    # Grouping by category lets each worker reuse its category mask across brand sets
+    return [
+        (category, brand_set, min_rating, min_qty)
+        for category in categories
+        for brand_set in brand_sets
+    ]
+
+
+def write_report(report, output):
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if output.suffix.lower() == '.csv':
+        report.to_csv(output, index=False)
+    else:
+        report.to_parquet(output, engine="pyarrow", index=False)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('data_file', help="Excel or CSV catalog, same format as the dashboard upload")
+    parser.add_argument('--brand-set', action='append', default=[], metavar='BRANDS',
+                        help="Comma-separated brands to compare; repeat for more sets (default: all brands)")
+    parser.add_argument('--category', action='append', default=[],
+                        help=f"Category to report; repeat for more, '{ALL_CATEGORIES}' for no filter "
+                             "(default: All plus every category)")
+    parser.add_argument('--min-rating', type=float, default=0.0)
+    parser.add_argument('--min-qty', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument('--output', default='brand_metrics.parquet',
+                        help="Output file; .csv writes CSV, anything else Parquet")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+
+    cache = DatasetCache()
+    try:
+        df = load_dataset(args.data_file, cache=cache)
+    except MissingColumnsError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        # Missing or unreadable file, empty or malformed CSV, corrupt workbook
+        reason = e.strerror if isinstance(e, OSError) and e.strerror else e
+        print(f"error: cannot read {args.data_file}: {reason}", file=sys.stderr)
+        return 2
+    dataset_hash = df.attrs['dataset_hash']
+
+    brand_sets = [
+        tuple(brand.strip() for brand in brand_set.split(',') if brand.strip())
+        for brand_set in args.brand_set
+    ]
+    combinations = build_combinations(df, brand_sets, args.category, args.min_rating, args.min_qty)
+    del df
+
+    workers = max(1, min(args.workers or 1, len(combinations)))
+    chunksize = max(1, len(combinations) // (workers * 4))
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(cache.path_for(dataset_hash), dataset_hash)) as pool:
+        for combination_rows in pool.map(combination_metrics, combinations, chunksize=chunksize):
+            rows.extend(combination_rows)
+
+    write_report(pd.DataFrame(rows), args.output)
+    print(f"Wrote {len(rows)} rows for {len(combinations)} combinations to {args.output} "
+          f"with {workers} workers in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Process-wide LRU/TTL cache of filter results shared by every dashboard session"""
+import os
+import sys
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from cachetools import TTLCache
+
+from search_index import tokenize
+
+# ========== CONFIGURATION ==========
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 3600))  # seconds
+
+
+def result_size(value):
+    """Approximate in-memory bytes of a cached result, for the memory cap"""
+    if isinstance(value, (pd.Series, pd.DataFrame, pd.Index)):
+        return int(np.sum(value.memory_usage(index=True, deep=False)))
+    if hasattr(value, 'max_nbytes'):
+        # Lazily extended results (TopKOrder) keep growing after they are cached,
+        # so they are charged for their largest size up front
+        return value.max_nbytes
+    if hasattr(value, 'nbytes'):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_size(k) + result_size(v) for k, v in value.items())
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def filter_state_key(categories, brands, price_range, min_rating, min_qty, search=''):
+    """Normalized, hashable filter state; selection order does not change the rows"""
+    return (
+        tuple(sorted(categories)),
+        tuple(sorted(brands)),
+        (float(price_range[0]), float(price_range[1])),
+        float(min_rating),
+        int(min_qty),
+        tuple(sorted(tokenize(search)))
+    )
+
+
+class ResultCache:
+    """Results keyed by (kind, dataset hash, filter state, ...), bounded by bytes and age
+
+    Entries are evicted least-recently-used once max_bytes is reached and
+    expire after ttl seconds. Hits and misses are counted per kind.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL):
+        self._cache = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=result_size)
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get_or_compute(self, key, compute):
+        """Cached value for key, or compute() stored under it; key[0] names the result kind"""
+        kind = key[0]
+        with self._lock:
+            try:
+                value = self._cache[key]
+            except KeyError:
+                self.misses[kind] += 1
+            else:
+                self.hits[kind] += 1
+                return value
+
+        # Computed outside the lock; concurrent misses on one key just both compute
+        value = compute()
+        with self._lock:
+            try:
+                self._cache[key] = value
+            except ValueError:
+                # Larger than the whole cache - hand it back uncached
+                pass
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """Hit counters per kind plus current size, as a DataFrame"""
+        with self._lock:
+            kinds = sorted(set(self.hits) | set(self.misses))
+            rows = [{'Result': kind, 'Hits': self.hits[kind], 'Misses': self.misses[kind]} for kind in kinds]
+            entries, used = len(self._cache), self._cache.currsize
+        stats = pd.DataFrame(rows, columns=['Result', 'Hits', 'Misses'])
+        lookups = stats['Hits'] + stats['Misses']
+        stats['Hit rate %'] = (stats['Hits'] / lookups.where(lookups > 0) * 100).round(1)
+        stats.attrs.update(entries=entries, used_bytes=used, max_bytes=self._cache.maxsize)
+        return stats
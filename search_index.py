@@ -0,0 +1,92 @@
+"""Inverted index for product search: word postings plus a trigram index over the vocabulary"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# ========== CONFIGURATION ==========
+SEARCH_FIELDS = ('Title',)
+NGRAM = 3
+
+TOKEN_PATTERN = re.compile(r'[0-9a-z]+')
+
+
+def tokenize(text):
+    """Lowercase alphanumeric terms of a query, duplicates dropped"""
+    return list(dict.fromkeys(TOKEN_PATTERN.findall(str(text).lower())))
+
+
+def _ngrams(term):
+    return {term[i:i + NGRAM] for i in range(len(term) - NGRAM + 1)}
+
+
+class SearchIndex:
+    """Rows whose searchable text contains every query term, as a boolean mask
+
+    Each distinct text (most titles repeat across colours and sizes) is
+    indexed once. A query term matches every vocabulary word that contains
+    it: the word's character trigrams narrow the candidates, and terms
+    shorter than a trigram fall back to a prefix range of the sorted
+    vocabulary. Postings of the matched words are OR-ed, terms are AND-ed,
+    and the document hits are expanded to rows with a single gather.
+    """
+
+    def __init__(self, df, fields=SEARCH_FIELDS):
+        text = df[fields[0]].astype(str)
+        for field in fields[1:]:
+            text = text + ' ' + df[field].astype(str)
+        self._row_docs, documents = pd.factorize(text, sort=False)
+        self.n_docs = len(documents)
+
+        # (document, word) pairs -> CSR postings from each word to its documents
+        words = pd.Series(documents, dtype=object).str.lower().str.findall(TOKEN_PATTERN.pattern).explode().dropna()
+        pairs = pd.DataFrame({'doc': words.index.to_numpy(), 'word': words.to_numpy()}).drop_duplicates()
+        word_ids, vocabulary = pd.factorize(pairs['word'], sort=True)
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+
+        order = np.lexsort((pairs['doc'].to_numpy(), word_ids))
+        self._postings = pairs['doc'].to_numpy()[order].astype(np.int32)
+        self._offsets = np.searchsorted(word_ids[order], np.arange(len(self.vocabulary) + 1))
+
+        # Trigram -> vocabulary ids, for substring matches inside words
+        grams = {}
+        for word_id, word in enumerate(self.vocabulary):
+            for gram in _ngrams(word):
+                grams.setdefault(gram, []).append(word_id)
+        self._grams = {gram: np.array(ids, dtype=np.int32) for gram, ids in grams.items()}
+
+    def matching_words(self, term):
+        """Vocabulary ids of the words containing term"""
+        if len(term) < NGRAM:
+            low = np.searchsorted(self.vocabulary, term, side='left')
+            high = np.searchsorted(self.vocabulary, term + '\uffff', side='left')
+            return np.arange(low, high)
+
+        candidates = None
+        for gram in _ngrams(term):
+            ids = self._grams.get(gram)
+            if ids is None:
+                return np.empty(0, dtype=np.int32)
+            candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+        return np.array([word_id for word_id in candidates if term in self.vocabulary[word_id]], dtype=np.int32)
+
+    def document_hits(self, term):
+        """Documents containing term, gathering all matched words' postings at once"""
+        word_ids = self.matching_words(term)
+        starts, ends = self._offsets[word_ids], self._offsets[word_ids + 1]
+        lengths = ends - starts
+        # Flat indices of every posting range, without a Python loop per word
+        flat = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        hits = np.zeros(self.n_docs, dtype=bool)
+        hits[self._postings[flat]] = True
+        return hits
+
+    def mask(self, query):
+        """Row mask for a query, or None when it has no terms (no restriction)"""
+        terms = tokenize(query)
+        if not terms:
+            return None
+        hits = np.ones(self.n_docs, dtype=bool)
+        for term in terms:
+            hits &= self.document_hits(term)
+        return hits[self._row_docs]
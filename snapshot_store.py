@@ -0,0 +1,137 @@
+"""Append-only history of catalog snapshots, stored as date-partitioned Parquet"""
+import json
+import os
+import time
+from datetime import date
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ========== CONFIGURATION ==========
+SNAPSHOT_DIR = Path(os.environ.get("SNAPSHOT_DIR", "data/snapshots"))
+
+# Fixed on-disk schema so every partition reads back with the same types
+SNAPSHOT_SCHEMA = pa.schema([
+    ('Product_Link', pa.string()),
+    ('Title', pa.string()),
+    ('Brand', pa.string()),
+    ('Category', pa.string()),
+    ('Current', pa.float32()),
+    ('Qty', pa.int32()),
+    ('Avg Rating', pa.float32()),
+    ('Image_URL', pa.string())
+])
+PARTITIONING = ds.partitioning(pa.schema([('snapshot_date', pa.date32())]), flavor='hive')
+
+
+class SnapshotExistsError(ValueError):
+    """Raised when a different file is ingested for a date that already has a snapshot"""
+
+
+class SnapshotStore:
+    """One immutable Parquet partition per snapshot date, keyed by Product_Link
+
+    A manifest records the content hash of every ingested file, so ingesting
+    the same file again is a no-op and only new snapshots are processed.
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = Path(root)
+        self._manifest_path = self.root / "_manifest.json"
+
+    # ---------- manifest ----------
+    def manifest(self):
+        try:
+            return json.loads(self._manifest_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+        os.replace(tmp_path, self._manifest_path)
+
+    def has(self, digest):
+        return digest in self.manifest()
+
+    def snapshot_dates(self):
+        """Dates with a stored snapshot, oldest first"""
+        return sorted(date.fromisoformat(entry['snapshot_date']) for entry in self.manifest().values())
+
+    # ---------- ingest ----------
+    def ingest(self, df, snapshot_date, digest):
+        """Append df as the snapshot for snapshot_date; False if digest was already ingested"""
+        manifest = self.manifest()
+        if digest in manifest:
+            return False
+
+        partition = self.root / f"snapshot_date={snapshot_date.isoformat()}"
+        if partition.exists():
+            raise SnapshotExistsError(f"A snapshot for {snapshot_date.isoformat()} is already stored")
+
+        # One row per product per snapshot
+        df = df.drop_duplicates(subset='Product_Link', keep='last')
+        table = pa.Table.from_pandas(df[SNAPSHOT_SCHEMA.names], preserve_index=False)
+        table = table.cast(SNAPSHOT_SCHEMA)
+
+        # Write into a temp directory and rename, so readers never see half a partition
+        tmp_partition = self.root / f".tmp-{digest}"
+        tmp_partition.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table, tmp_partition / f"part-{digest[:16]}.parquet")
+        os.replace(tmp_partition, partition)
+
+        manifest[digest] = {
+            'snapshot_date': snapshot_date.isoformat(),
+            'rows': table.num_rows,
+            'ingested_at': time.time()
+        }
+        self._save_manifest(manifest)
+        return True
+
+    # ---------- queries ----------
+    def dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning=PARTITIONING,
+                          exclude_invalid_files=True, ignore_prefixes=['.', '_'])
+
+    def brand_trends(self, brands=None, categories=None, start=None, end=None):
+        """Per-brand average price, total qty and average rating for every snapshot date
+
+        Only the Brand, Category, Current, Qty and Avg Rating columns are read,
+        and date bounds prune whole partitions before any file is opened.
+        """
+        if not self.manifest():
+            return None
+
+        expression = pc.scalar(True)
+        if start is not None:
+            expression &= pc.field('snapshot_date') >= pa.scalar(start, type=pa.date32())
+        if end is not None:
+            expression &= pc.field('snapshot_date') <= pa.scalar(end, type=pa.date32())
+        if brands:
+            expression &= pc.field('Brand').isin(list(brands))
+        if categories:
+            expression &= pc.field('Category').isin(list(categories))
+
+        table = self.dataset().to_table(
+            columns=['snapshot_date', 'Brand', 'Current', 'Qty', 'Avg Rating'],
+            filter=expression
+        )
+        trends = table.group_by(['snapshot_date', 'Brand']).aggregate([
+            ('Current', 'mean'),
+            ('Qty', 'sum'),
+            ('Avg Rating', 'mean'),
+            ('Current', 'count')
+        ])
+
+        trends_df = trends.to_pandas().rename(columns={
+            'snapshot_date': 'Snapshot Date',
+            'Current_mean': 'Avg Price',
+            'Qty_sum': 'Total Qty',
+            'Avg Rating_mean': 'Avg Rating',
+            'Current_count': 'Products'
+        })
+        return trends_df.sort_values(['Snapshot Date', 'Brand']).reset_index(drop=True)
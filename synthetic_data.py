@@ -0,0 +1,96 @@
+"""Synthetic Macy's-style catalogs of any size, for load and performance testing
+
+    python synthetic_data.py --rows 1000000 --brands 200 --output catalog.csv
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ADJECTIVES = ['Classic', 'Casual', 'Leather', 'Floral', 'Sport', 'Gold Plated', 'Designer', 'Athletic',
+              'Formal', 'Winter', 'Summer', 'Denim', 'Active', 'Vintage', 'Slim Fit', 'Oversized']
+PRODUCTS = ['Ankle Boots', 'Sneakers', 'Crossbody Bag', 'Dress', 'Jacket', 'Necklace', 'Handbag',
+            'Running Shoes', 'Dress Shirt', 'T-Shirt', 'Parka', 'Maxi Dress', 'Suit Set', 'Leggings',
+            'Hoodie', 'Swimwear Set', 'Sandals', 'Watch', 'Scarf', 'Sunglasses']
+AUDIENCES = ["Women's", "Men's", "Kids'", "Unisex"]
+
+
+def brand_weights(n_brands, zipf_s):
+    """Share of products per brand, Zipf-distributed by brand rank"""
+    weights = 1.0 / np.arange(1, n_brands + 1) ** zipf_s
+    return weights / weights.sum()
+
+
+def generate_catalog(rows, n_brands=12, n_categories=6, zipf_s=1.1, missing_image_rate=0.05,
+                     zero_qty_rate=0.1, seed=42):
+    """Raw catalog rows with the dashboard's column names, before cleaning
+
+    Brand sizes follow a Zipf law with exponent zipf_s, so a few brands hold
+    most products as in real scrapes. missing_image_rate of the rows have an
+    empty Image_URL and zero_qty_rate have Qty 0 (rendered as NEW).
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(rows)
+
+    brands = np.array([f"Brand {i:03d}" for i in range(n_brands)], dtype=object)
+    categories = np.array([f"Category {i:02d}" for i in range(n_categories)], dtype=object)
+    titles = np.array([f"{audience} {adjective} {product}"
+                       for audience in AUDIENCES for adjective in ADJECTIVES for product in PRODUCTS],
+                      dtype=object)
+
+    qty = rng.geometric(1 / 150, rows)
+    qty[rng.random(rows) < zero_qty_rate] = 0
+
+    image_urls = pd.Series(ids).map('https://images.example.com/products/{:08d}.jpg'.format)
+    image_urls[rng.random(rows) < missing_image_rate] = ''
+
+    # Unrated products get 0, like the scraped files
+    ratings = rng.uniform(1.0, 5.0, rows).round(1)
+    ratings[rng.random(rows) < 0.2] = 0
+
+    return pd.DataFrame({
+        'Product_Link': pd.Series(ids).map('https://www.macys.com/shop/product/{:08d}'.format),
+        'Image_URL': image_urls,
+        'Qty': qty,
+        'Title': titles[rng.integers(0, len(titles), rows)],
+        'Brand': brands[rng.choice(n_brands, rows, p=brand_weights(n_brands, zipf_s))],
+        'Current': rng.lognormal(mean=4.3, sigma=0.7, size=rows).clip(5, 2000).round(2),
+        'Avg Rating': ratings,
+        'Category': categories[rng.integers(0, n_categories, rows)]
+    })
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--brands', type=int, default=12)
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--zipf', type=float, default=1.1, help="Brand size skew exponent (0 = uniform)")
+    parser.add_argument('--missing-image-rate', type=float, default=0.05)
+    parser.add_argument('--zero-qty-rate', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='synthetic_catalog.csv',
+                        help="Output file; .xlsx writes Excel, .parquet Parquet, anything else CSV")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = generate_catalog(args.rows, n_brands=args.brands, n_categories=args.categories, zipf_s=args.zipf,
+                          missing_image_rate=args.missing_image_rate, zero_qty_rate=args.zero_qty_rate,
+                          seed=args.seed)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if output.suffix.lower() == '.xlsx':
+        df.to_excel(output, index=False)
+    elif output.suffix.lower() == '.parquet':
+        df.to_parquet(output, engine="pyarrow", index=False)
+    else:
+        df.to_csv(output, index=False)
+    print(f"Wrote {len(df)} rows to {output}")
+
+
+if __name__ == "__main__":
+    main()
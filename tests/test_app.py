@@ -0,0 +1,27 @@
+"""Sidebar behaviour of the dashboard script, run headless with AppTest"""
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+
+
+def test_brand_selection_survives_category_change():
+    at = AppTest.from_file(APP, default_timeout=120).run()
+    brands = next(widget for widget in at.multiselect if widget.label == "Choose brands to analyze")
+    picked = brands.options[-2:]
+    brands.set_value(picked).run()
+
+    categories = next(widget for widget in at.multiselect if widget.label == "Select Categories")
+    categories.set_value(categories.value[1:]).run()
+
+    assert not at.exception
+    brands = next(widget for widget in at.multiselect if widget.label == "Choose brands to analyze")
+    assert brands.value == picked
+
+
+def test_sessions_share_one_catalog_frame():
+    first = AppTest.from_file(APP, default_timeout=120).run()
+    second = AppTest.from_file(APP, default_timeout=120).run()
+    second.run()
+    assert first.session_state['filter_engine'].df is second.session_state['filter_engine'].df
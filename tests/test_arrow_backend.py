@@ -0,0 +1,106 @@
+"""ArrowCatalog scans over Parquet must give the in-memory backend's pages and metrics"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import arrow_backend
+from arrow_backend import CARD_COLUMNS, ArrowCatalog, ArrowFilterEngine
+from core import (
+    MIXED_SORT_OPTIONS, SORT_KEYS, FilterEngine, apply_sorting, calculate_metrics, parse_source,
+    shuffle_mixed_brands, summarize
+)
+from synthetic_data import generate_catalog
+
+PAGE_SIZE = 60
+
+
+@pytest.fixture(scope='module')
+def catalogs(tmp_path_factory):
+    raw = generate_catalog(30_000)
+    df = parse_source(io.BytesIO(raw.to_csv(index=False).encode()), 'catalog.csv')
+    df.attrs['dataset_hash'] = 'synthetic'
+    path = tmp_path_factory.mktemp('catalog') / 'catalog.parquet'
+    df.to_parquet(path, engine='pyarrow', index=False)
+    return df, ArrowCatalog(path)
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    # Several scan batches per query, so the cross-batch merging is exercised
+    monkeypatch.setattr(arrow_backend, 'SCAN_BATCH_ROWS', 4096)
+
+
+def filter_states(df):
+    categories = sorted(df['Category'].unique())
+    brands = df['Brand'].value_counts().index.tolist()
+    low, high = float(df['Current'].min()), float(df['Current'].max())
+    return [
+        ([], brands[:4], (low, high), 0.0, 0),
+        (categories[:3], brands[2:7], (40.0, 400.0), 3.5, 0),
+        (categories[1:], [brands[0], brands[-1], brands[5]], (low, 150.0), 0.0, 50),
+        (categories[:1], brands[-2:], (low, high), 4.5, 10)
+    ]
+
+
+def engines(df, catalog, state):
+    categories, brands, price_range, min_rating, min_qty = state
+    memory, arrow = FilterEngine(df), ArrowFilterEngine(catalog)
+    for engine in (memory, arrow):
+        engine.filter_categories(categories)
+        engine.filter_brands(brands)
+        engine.filter_price(price_range)
+        engine.filter_min_rating(min_rating)
+        engine.filter_min_qty(min_qty)
+    return memory.apply(), arrow.mask()
+
+
+def page_windows(total):
+    return [(0, PAGE_SIZE), (PAGE_SIZE, 2 * PAGE_SIZE), (total // 2, total // 2 + PAGE_SIZE),
+            (max(0, total - PAGE_SIZE // 2), total + PAGE_SIZE // 2)]
+
+
+def assert_pages_equal(page, expected):
+    expected = expected[CARD_COLUMNS].reset_index(drop=True)
+    expected = expected.astype({column: object for column in ('Brand', 'Category')})
+    pd.testing.assert_frame_equal(page.reset_index(drop=True), expected, check_dtype=False,
+                                  check_index_type=False)
+
+
+@pytest.mark.parametrize('sort_by', list(SORT_KEYS))
+def test_sorted_pages_match_apply_sorting(catalogs, sort_by):
+    df, catalog = catalogs
+    for state in filter_states(df):
+        filtered_df, expression = engines(df, catalog, state)
+        ordered = apply_sorting(filtered_df, sort_by)
+        for start, stop in page_windows(len(filtered_df)):
+            page = catalog.page(expression, start, stop, sort_keys=SORT_KEYS[sort_by])
+            assert_pages_equal(page, ordered.iloc[start:stop])
+
+
+@pytest.mark.parametrize('sort_by', MIXED_SORT_OPTIONS)
+def test_mixed_pages_match_shuffle_mixed_brands(catalogs, sort_by):
+    df, catalog = catalogs
+    weighted = sort_by == 'Mixed Brands (Weighted)'
+    for state in filter_states(df):
+        filtered_df, expression = engines(df, catalog, state)
+        brands = state[1]
+        brand_counts = {brand: int((filtered_df['Brand'] == brand).sum()) for brand in brands}
+        mixed = shuffle_mixed_brands(filtered_df, brands, weighted=weighted)
+        for start, stop in page_windows(len(filtered_df)):
+            page = catalog.page(expression, start, stop, brand_counts=brand_counts, weighted=weighted)
+            assert_pages_equal(page, mixed.iloc[start:stop])
+
+
+def test_brand_metrics_and_summary_match(catalogs):
+    df, catalog = catalogs
+    for state in filter_states(df):
+        filtered_df, expression = engines(df, catalog, state)
+        brands = state[1]
+        assert catalog.brand_metrics(expression, brands) == calculate_metrics(filtered_df, brands)
+
+        summary, expected = catalog.summary(expression), summarize(filtered_df)
+        assert summary['total_products'] == expected['total_products']
+        assert summary['median_qty'] == expected['median_qty']
+        assert summary['avg_price'] == pytest.approx(expected['avg_price'], rel=1e-9)
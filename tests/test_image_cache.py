@@ -0,0 +1,99 @@
+"""ImageCache against a local HTTP stand-in: thumbnails, failed URLs and LRU eviction"""
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from image_cache import ImageCache
+
+
+def image_bytes(image_format, mode='RGB', size=(900, 1200)):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 30, 60, 128) if mode == 'RGBA' else (200, 30, 60)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+ROUTES = {
+    '/photo.jpg': ('image/jpeg', image_bytes('JPEG')),
+    '/logo.png': ('image/png', image_bytes('PNG', mode='RGBA', size=(600, 200))),
+    '/corrupt.jpg': ('image/jpeg', b'\xff\xd8\xff not really a jpeg'),
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # /copies/<n>.jpg serves the same JPEG under any number of URLs
+        content_type, body = ROUTES.get(self.path, ROUTES['/photo.jpg'] if self.path.startswith('/copies/')
+                                        else (None, None))
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ImageCache(root=tmp_path / "thumbnails", failed_log=tmp_path / "failed.json")
+
+
+def test_thumbnails_fit_their_boxes(server, cache):
+    for url in (f"{server}/photo.jpg", f"{server}/logo.png"):
+        for size, box in cache.sizes.items():
+            path = cache.thumbnail(url, size)
+            assert path is not None and path.suffix == f".{cache.extension}"
+            with Image.open(path) as thumb:
+                assert thumb.width <= box[0] and thumb.height <= box[1]
+    assert cache.failed_urls() == {}
+
+
+def test_broken_urls_are_remembered_outside_the_served_root(server, cache, tmp_path):
+    corrupt, missing = f"{server}/corrupt.jpg", f"{server}/missing.jpg"
+    assert cache.thumbnail(corrupt) is None
+    assert cache.thumbnail(missing) is None
+
+    failed = cache.failed_urls()
+    assert set(failed) == {corrupt, missing}
+    assert '404' in failed[missing]['error']
+    assert cache.is_failed(corrupt) and cache.is_failed(missing)
+    assert (tmp_path / "failed.json").exists()
+    assert not list((tmp_path / "thumbnails").rglob("*.json"))
+
+
+def test_eviction_drops_least_recently_used(server, tmp_path):
+    cache = ImageCache(root=tmp_path / "thumbnails", failed_log=tmp_path / "failed.json",
+                       sizes={'card': (300, 400)})
+    urls = [f"{server}/copies/{n}.jpg" for n in range(4)]
+    assert cache.thumbnail(urls[0]) is not None
+    entry_bytes = cache.path_for(urls[0], 'card').stat().st_size
+    cache.max_bytes = int(entry_bytes * 3.5)
+
+    for url in urls[1:3]:
+        time.sleep(0.01)
+        assert cache.thumbnail(url) is not None
+    # Using the oldest entry makes the second one least recently used
+    time.sleep(0.01)
+    assert cache.cached_path(urls[0], 'card') is not None
+    time.sleep(0.01)
+    assert cache.thumbnail(urls[3]) is not None
+
+    assert cache.cached_path(urls[1], 'card') is None
+    assert all(cache.cached_path(url, 'card') is not None for url in (urls[0], urls[2], urls[3]))
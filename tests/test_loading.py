@@ -0,0 +1,23 @@
+"""Chunked readers must build the same compact catalog as a single pass"""
+import io
+
+from core import read_csv_chunked, read_xlsx_streaming
+from synthetic_data import generate_catalog
+
+
+def test_csv_chunks_merge_into_one_compact_frame():
+    data = generate_catalog(3_000, n_brands=40).to_csv(index=False).encode()
+    chunked = read_csv_chunked(io.BytesIO(data), chunk_rows=300)
+    whole = read_csv_chunked(io.BytesIO(data), chunk_rows=10_000)
+    assert chunked.equals(whole)
+    assert chunked.dtypes.equals(whole.dtypes)
+    assert chunked['Brand'].cat.categories.is_monotonic_increasing
+
+
+def test_xlsx_chunks_match_csv():
+    raw = generate_catalog(1_000, n_brands=40)
+    workbook = io.BytesIO()
+    raw.to_excel(workbook, index=False)
+    workbook.seek(0)
+    xlsx = read_xlsx_streaming(workbook, chunk_rows=150)
+    assert xlsx.equals(read_csv_chunked(io.BytesIO(raw.to_csv(index=False).encode())))
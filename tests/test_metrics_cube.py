@@ -0,0 +1,58 @@
+"""MetricsCube.rollup must give the same numbers as aggregating the filtered rows"""
+import io
+
+import numpy as np
+import pytest
+
+from core import FilterEngine, calculate_metrics, parse_source, summarize
+from metrics_cube import MetricsCube
+from synthetic_data import generate_catalog
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    raw = generate_catalog(50_000)
+    df = parse_source(io.BytesIO(raw.to_csv(index=False).encode()), 'catalog.csv')
+    df.attrs['dataset_hash'] = 'synthetic'
+    return df, MetricsCube(df)
+
+
+def random_states(df, count, seed=0):
+    """Category, brand, price, rating and Qty filters drawn like the sidebar sets them"""
+    rng = np.random.default_rng(seed)
+    categories = sorted(df['Category'].unique())
+    brands = sorted(df['Brand'].unique())
+    low, high = float(df['Current'].min()), float(df['Current'].max())
+    for _ in range(count):
+        yield (
+            list(rng.choice(categories, rng.integers(0, len(categories) + 1), replace=False)),
+            list(rng.choice(brands, rng.integers(1, 6), replace=False)),
+            (low + 10 * rng.integers(0, 5), high - 10 * rng.integers(0, 20)),
+            float(rng.choice([0, 0, 1, 3.5, 4.5])),
+            int(rng.choice([0, 0, 10, 50]))
+        )
+
+
+def test_rollup_matches_calculate_metrics(catalog):
+    df, cube = catalog
+    for categories, brands, price_range, min_rating, min_qty in random_states(df, 200):
+        engine = FilterEngine(df)
+        engine.filter_categories(categories)
+        engine.filter_brands(brands)
+        engine.filter_price(price_range)
+        engine.filter_min_rating(min_rating)
+        engine.filter_min_qty(min_qty)
+        filtered_df = engine.apply()
+
+        metrics, summary = cube.rollup(categories, brands, price_range, min_rating, min_qty)
+        assert metrics == calculate_metrics(filtered_df, brands)
+        expected = summarize(filtered_df)
+        assert summary['total_products'] == expected['total_products']
+        if len(filtered_df):
+            assert summary['avg_price'] == pytest.approx(expected['avg_price'], rel=1e-9)
+
+
+def test_facets_match_filter_engine(catalog):
+    df, cube = catalog
+    categories = sorted(df['Category'].unique())[:2]
+    assert cube.facets(categories) == FilterEngine(df).category_facets(categories)
@@ -0,0 +1,44 @@
+"""The profile log is capped by rotation and read back from its tail"""
+import json
+
+from profiling import StageProfiler, rotated_path, stage_percentiles, tail_lines
+
+
+def write_runs(log_path, count, max_bytes):
+    for run in range(count):
+        profiler = StageProfiler(enabled=True, log_path=log_path, trace_memory=False, max_bytes=max_bytes)
+        profiler.begin('load')
+        profiler.begin('render')
+        profiler.write(session_id=f"run-{run}")
+
+
+def test_log_rotates_past_max_bytes(tmp_path):
+    log_path = tmp_path / 'profile.jsonl'
+    write_runs(log_path, 2000, max_bytes=50_000)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['profile.jsonl', 'profile.jsonl.1']
+    # A record is appended after the size check, so the log overshoots by at most one line
+    assert rotated_path(log_path).stat().st_size < 50_000 + 1_000
+    assert log_path.stat().st_size < 50_000 + 1_000
+    assert json.loads(log_path.read_text().splitlines()[-1])['session_id'] == 'run-1999'
+
+
+def test_tail_lines_match_splitlines(tmp_path):
+    path = tmp_path / 'lines.txt'
+    lines = [f"line {i} " + 'x' * (i % 300) for i in range(3000)]
+    path.write_text('\n'.join(lines) + '\n')
+
+    for count in (0, 1, 2, 999, 2999, 3000, 5000):
+        assert tail_lines(path, count) == (lines[-count:] if count else [])
+    assert tail_lines(tmp_path / 'missing.txt', 10) == []
+
+
+def test_percentiles_span_the_rotated_log(tmp_path):
+    log_path = tmp_path / 'profile.jsonl'
+    assert stage_percentiles(log_path) is None
+
+    write_runs(log_path, 500, max_bytes=20_000)
+    kept = len(log_path.read_text().splitlines()) + len(rotated_path(log_path).read_text().splitlines())
+    percentiles = stage_percentiles(log_path, last=kept).set_index('Stage')
+    assert percentiles.loc['load', 'Runs'] == kept
+    assert stage_percentiles(log_path, last=10).set_index('Stage').loc['render', 'Runs'] == 10
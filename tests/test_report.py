@@ -0,0 +1,20 @@
+"""report.py must exit with a one-line error, not a traceback, on files it cannot load"""
+import pytest
+
+import report
+
+
+@pytest.mark.parametrize('name, content', [
+    ('missing.csv', None),
+    ('empty.csv', b''),
+    ('corrupt.xlsx', b'not a workbook'),
+    ('catalog.csv', b'Title,Brand\nShirt,Nike\n'),
+])
+def test_unreadable_data_file_exits_with_message(tmp_path, monkeypatch, capsys, name, content):
+    monkeypatch.chdir(tmp_path)
+    if content is not None:
+        (tmp_path / name).write_bytes(content)
+
+    assert report.main([name, '--workers', '1']) == 2
+    err = capsys.readouterr().err
+    assert err.startswith('error: ') and err.count('\n') == 1
@@ -0,0 +1,43 @@
+"""TopKOrder slices must concatenate to the same order as the full stable sort"""
+import io
+
+import numpy as np
+import pytest
+
+from core import SORT_KEYS, TOPK_SORTS, TopKOrder, parse_source, sort_permutation
+from synthetic_data import generate_catalog
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    raw = generate_catalog(20_000)
+    # Few distinct keys, so most slice ends fall inside a run of ties
+    rng = np.random.default_rng(1)
+    raw['Current'] = rng.choice([19.99, 49.5, 49.5, 120.0], len(raw))
+    raw['Qty'] = rng.choice([0, 0, 3, 150], len(raw))
+    raw['Avg Rating'] = rng.choice([0, 4.5, 4.5, 5.0], len(raw))
+    df = parse_source(io.BytesIO(raw.to_csv(index=False).encode()), 'catalog.csv')
+    positions = np.flatnonzero(rng.random(len(df)) < 0.6)
+    return df, positions
+
+
+@pytest.mark.parametrize('sort_by', TOPK_SORTS)
+@pytest.mark.parametrize('page_size', [1, 7, 60, 257, 5000])
+def test_slices_match_sort_permutation(catalog, sort_by, page_size):
+    df, positions = catalog
+    expected = positions[sort_permutation(df.iloc[positions], SORT_KEYS[sort_by])]
+
+    order = TopKOrder.for_sort(df, positions, sort_by)
+    pages = [order[start:start + page_size] for start in range(0, len(positions), page_size)]
+    np.testing.assert_array_equal(np.concatenate(pages), expected)
+
+
+@pytest.mark.parametrize('sort_by', TOPK_SORTS)
+def test_out_of_order_pages_match_sort_permutation(catalog, sort_by):
+    df, positions = catalog
+    expected = positions[sort_permutation(df.iloc[positions], SORT_KEYS[sort_by])]
+
+    # Jumping ahead first, then back, as the page number input allows
+    order = TopKOrder.for_sort(df, positions, sort_by)
+    for start, stop in [(3000, 3060), (0, 60), (60, 120), (len(positions) - 60, len(positions))]:
+        np.testing.assert_array_equal(order[start:stop], expected[start:stop])